@@ -11,71 +11,86 @@ by Tobias Küster, 2015
 """
 
 from itertools import combinations
-from collections import defaultdict
-import stemmer # http://tartarus.org/~martin/PorterStemmer/
-import re
+from collections import defaultdict, Counter
+from bib_model import BibCorpus
+from bib_tokens import BAD_WORDS, WORDS_PATTERN, STEMMER, get_title_tokens, normalize_word
+from bib_ngrams import count_ngrams
 
-# some words that are not interesting for common title words, n-grams, etc.
-BAD_WORDS = set(['a', 'about', 'an', 'and', 'are', 'as', 'at', 'be', 'between', 
-                 'by', 'can', 'do', 'for', 'from', 'here', 'how', 'in', 'into', 
-                 'is', 'new', 'no', 'of', 'on', 'or', 'over', 'the', 'to', 
-                 'towards', 'under', 'using', 'via', 'what', 'when', 'who', 
-                 'why', 'with']
-)
-
-# regular expression for finding words in titles
-#TODO improve this regex
-WORDS_PATTERN = re.compile(r"[a-z0-9-_]*[a-z][a-z0-9-_]*")
+def iter_authors(bibitems):
+	"""Iterate the author tuples of the items; for a BibCorpus, this is done
+	directly on its columns, without creating item views.
+	"""
+	if isinstance(bibitems, BibCorpus):
+		return bibitems.iter_authors()
+	return (item.authors for item in bibitems)
 
-# the stemmer used for normalizing the words
-STEMMER = stemmer.PorterStemmer()
+def iter_titles(bibitems):
+	"""Iterate the titles of the items, like iter_authors.
+	"""
+	if isinstance(bibitems, BibCorpus):
+		return bibitems.iter_titles()
+	return (item.title for item in bibitems)
 
 def get_coauthors(bibitems):
 	"""Get number of papers co-authored together for each pair of co-authors.
 	"""
 	coauthors = defaultdict(int)
-	for item in bibitems:
-		for pair in combinations(item.authors, 2):
+	for authors in iter_authors(bibitems):
+		for pair in combinations(authors, 2):
 			coauthors[tuple(sorted(pair))] += 1
 	return dict(coauthors)
 	
 def get_papers_per_author(bibitems, min_num=1):
 	"""Get the number of papers each author has written.
 	"""
-	papers = defaultdict(int)
-	for item in bibitems:
-		for author in item.authors:
-			papers[author] += 1
+	if isinstance(bibitems, BibCorpus):
+		names = bibitems.author_names
+		papers = {names[i]: num for i, num in Counter(bibitems.author_index).items()}
+	else:
+		papers = Counter(author for authors in iter_authors(bibitems) for author in authors)
 	return {author: num for author, num in papers.items() if num >= min_num}
 
-def get_title_ngrams(bibitems, n, min_num=1, stemming=False):
+def get_title_words(title, stemming=False):
+	"""Get the (optionally stemmed) words of the title, without bad words.
+	"""
+	title_words = (normalize_word(word, stemming) for word in WORDS_PATTERN.findall(title.lower()))
+	return [word for word in title_words if word is not None]
+
+def get_title_ngrams(bibitems, n, min_num=1, stemming=False, top_k=None):
 	"""Get get all n-grams from 1 up to n for the title words in the papers.
+	With top_k, only about the top_k most frequent n-grams are counted, using
+	bounded memory, and their counts may be overestimated.
 	"""
-	stem = STEMMER.stemWord if stemming else str
-	ngrams = defaultdict(int)
-	for item in bibitems:
-		title_words = map(stem, WORDS_PATTERN.findall(item.title.lower()))
-		proper_title_words = [word for word in title_words if word not in BAD_WORDS]
-		for k in range(len(proper_title_words) - n):
-			ngrams[" ".join(proper_title_words[k:k+n])] += 1
-	return {key: val for key, val in ngrams.items() if val >= min_num}
+	tokens = get_title_tokens(bibitems, stemming)
+	ngrams = count_ngrams(tokens.titles, n, top_k)
+	words = tokens.words
+	return {" ".join(words[i] for i in key): val for key, val in ngrams.items() if val >= min_num}
 
-def get_authors_for_topic(bibitems, topic):
-	"""Get all authors writing about a certain topic.
+def get_authors_for_topic(bibitems, topic, stemming=False):
+	"""Get all authors writing about a certain topic, i.e. having the topic
+	word (optionally stemmed, like the title words) in the title. Bad words
+	are topics like any other word here, as in IncrementalAnalyzer.
 	"""
+	if not isinstance(bibitems, BibCorpus):
+		bibitems = list(bibitems)
+	if normalize_word(topic, stemming) is None:
+		# bad words are not in the title tokens, so look at the titles
+		matches = (topic in WORDS_PATTERN.findall(title.lower()) for title in iter_titles(bibitems))
+	else:
+		tokens = get_title_tokens(bibitems, stemming)
+		topic_id = tokens.word_id(topic)
+		matches = (topic_id is not None and topic_id in word_ids for word_ids in tokens.titles)
 	authors = set()
-	for item in bibitems:
-		#TODO use stemming, like above, maybe move to separate function
-		title_words = WORDS_PATTERN.findall(item.title.lower())
-		if topic in title_words:
-			authors.update(item.authors)
+	for match, item_authors in zip(matches, iter_authors(bibitems)):
+		if match:
+			authors.update(item_authors)
 	return authors
 
 # testing
 if __name__ == "__main__":
 	from pprint import pprint
-	import bib_parser
-	items = bib_parser.parse_bib_from_bibtex("literature.bib")
+	import bib_cache
+	items = bib_cache.parse_bib_cached("literature.bib")
 	pprint(get_coauthors(items))
 	pprint(sorted(get_title_ngrams(items, 1, 1).items(), key=lambda x: x[1]))
 	pprint(get_papers_per_author(items, 5))
@@ -0,0 +1,174 @@
+# -*- coding: utf8 -*-
+
+"""Author name normalization for Bibliography Analyzer Utility.
+by Tobias Küster, 2015
+
+- split "First Last" and "Last, First" names, fold umlauts and accents
+- group variants of the same name, e.g. "T. Küster" and "Kuester, Tobias",
+  comparing names only within blocks of the same phonetic key and initial
+- map all names to canonical names and apply that mapping to bibliography items
+"""
+
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from bib_model import BibItem, BibCorpus
+
+# name particles that belong to the last name, as in "Ludwig van Beethoven"
+PARTICLES = set(["da", "de", "del", "den", "der", "di", "du", "la", "le",
+                 "ten", "ter", "van", "von", "zu"])
+
+# Soundex digits for consonants; vowels, h, w and y are dropped
+SOUNDEX = dict((c, d) for d, cs in enumerate(("", "bfpv", "cgjkqsxz", "dt", "l", "mn", "r"))
+               for c in cs)
+
+# maximum number of name variants in one block compared to each other by
+# edit distance; in larger blocks, only names with equal last names are
+MAX_CANDIDATES = 50
+
+LATEX_PATTERN = re.compile(r'\\[a-zA-Z]+\s*|\\.|[{}]')
+UMLAUT_PATTERN = re.compile(r"([aou])e")
+GIVEN_PATTERN = re.compile(r"\w+")
+
+
+def fold(string):
+	"""Get lower-case ASCII version of string for comparing names: LaTeX
+	commands and braces are dropped, accents are stripped, and umlauts
+	written as "ae", "oe", "ue" are folded to "a", "o", "u", too.
+	"""
+	string = LATEX_PATTERN.sub("", string.lower().replace("ß", "ss"))
+	string = unicodedata.normalize("NFKD", string)
+	string = "".join(c for c in string if not unicodedata.combining(c))
+	return UMLAUT_PATTERN.sub(r"\1", string)
+
+def split_name(name):
+	"""Split name given as "First Last" or "Last, First" into first and last
+	name; particles such as "von" are part of the last name.
+	"""
+	name = " ".join(name.split())
+	if "," in name:
+		last, _, first = name.partition(",")
+		first = first.rsplit(",", 1)[-1]   # "Last, Jr., First"
+	else:
+		parts = name.split(" ")
+		i = len(parts) - 1
+		while i > 1 and parts[i-1].lower() in PARTICLES:
+			i -= 1
+		first, last = " ".join(parts[:i]), " ".join(parts[i:])
+	return first.strip(), last.strip()
+
+def soundex(word):
+	"""Get Soundex code of the (folded, ASCII) word, e.g. "R163"."""
+	letters = [c for c in word if c.isalpha()]
+	if not letters:
+		return ""
+	code, last = [letters[0].upper()], SOUNDEX.get(letters[0])
+	for c in letters[1:]:
+		digit = SOUNDEX.get(c)
+		if digit and digit != last:
+			code.append(str(digit))
+		if c not in "hw":
+			last = digit
+	return "".join(code)[:4].ljust(4, "0")
+
+def within_one_edit(a, b):
+	"""Check whether the strings differ in at most one insertion, deletion,
+	substitution or transposition of adjacent characters.
+	"""
+	if abs(len(a) - len(b)) > 1:
+		return False
+	i = 0
+	while i < min(len(a), len(b)) and a[i] == b[i]:
+		i += 1
+	if a[i+1:] == b[i+1:] or a[i+1:] == b[i:] or a[i:] == b[i+1:]:
+		return True
+	return (i + 1 < len(a) == len(b) and a[i] == b[i+1] and a[i+1] == b[i]
+	        and a[i+2:] == b[i+2:])
+
+def given_names_compatible(g1, g2):
+	"""Check whether the lists of (folded) given names can be the same
+	person's, with initials matching full names, e.g. ["t"] and ["tobias"].
+	"""
+	for a, b in zip(g1, g2):
+		if a != b and not (len(a) == 1 and b.startswith(a) or
+		                   len(b) == 1 and a.startswith(b)):
+			return False
+	return True
+
+
+class NameKey:
+	"""Folded parts of an author name, used for blocking and comparing."""
+
+	__slots__ = ("name", "last", "given", "block")
+
+	def __init__(self, name):
+		first, last = split_name(name)
+		self.name = name
+		self.last = "".join(GIVEN_PATTERN.findall(fold(last)))
+		self.given = GIVEN_PATTERN.findall(fold(first))
+		self.block = (soundex(self.last), self.given[0][0] if self.given else "")
+
+	def informativeness(self):
+		"""Get sort key preferring full given names over initials."""
+		return (sum(len(g) > 1 for g in self.given), len(self.given))
+
+
+def normalize_authors(names):
+	"""Group variants of the same author name.
+	- names is an iterable of author names, possibly with repetitions, which
+	  are used for choosing the most frequent variant as canonical name
+	- returns dict mapping each name to its canonical name
+	"""
+	counts = Counter(names)
+	blocks = defaultdict(list)
+	for name in counts:
+		key = NameKey(name)
+		blocks[key.block].append(key)
+
+	mapping = {}
+	for keys in blocks.values():
+		keys.sort(key=lambda k: (k.informativeness(), counts[k.name]), reverse=True)
+		clusters = defaultdict(list)   # last name -> representative keys
+		for key in keys:
+			candidates = clusters[key.last]
+			if len(keys) <= MAX_CANDIDATES:
+				candidates = [rep for last, reps in clusters.items() for rep in reps
+				              if within_one_edit(last, key.last)]
+			matches = [rep for rep in candidates if given_names_compatible(rep.given, key.given)]
+			if len(matches) == 1:
+				mapping[key.name] = mapping[matches[0].name]
+			else:
+				# new author, or ambiguous, such as "T. Küster" for "Tobias"
+				# and "Thomas Küster"; then, keep the name as it is
+				first, last = split_name(key.name)
+				mapping[key.name] = ("%s %s" % (first, last)).strip()
+				if not matches:
+					clusters[key.last].append(key)
+	return mapping
+
+def apply_mapping(bibitems, mapping):
+	"""Get BibCorpus of the items, with authors replaced by the canonical
+	names in the mapping, and duplicate authors per item dropped.
+	"""
+	return BibCorpus(BibItem(dict.fromkeys(mapping.get(a, a) for a in item.authors),
+	                         item.title, item.year) for item in bibitems)
+
+def canonicalize(bibitems):
+	"""Get BibCorpus of the items, with variants of author names replaced by
+	canonical names. All analyzer functions can be applied to the result.
+	"""
+	if isinstance(bibitems, BibCorpus):
+		names = (bibitems.author_names[i] for i in bibitems.author_index)
+	else:
+		bibitems = list(bibitems)
+		names = (author for item in bibitems for author in item.authors)
+	return apply_mapping(bibitems, normalize_authors(names))
+
+
+# testing
+if __name__ == "__main__":
+	from pprint import pprint
+	pprint(normalize_authors(["Tobias Küster", "T. Küster", "Kuester, Tobias",
+	                          "Küster, T.", "Thomas Küster", "Marco Lützenberger",
+	                          "M. Luetzenberger", "Ludwig van Beethoven",
+	                          "van Beethoven, L."]))
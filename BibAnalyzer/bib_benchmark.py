@@ -0,0 +1,321 @@
+# -*- coding: utf8 -*-
+
+"""Benchmarks for Bibliography Analyzer Utility.
+by Tobias Küster, 2015
+
+- generate synthetic BibTeX files, with configurable numbers and distributions
+  of authors and title words
+- time each stage of the analysis pipeline for different numbers of entries,
+  save the results as JSON and compare them to earlier results
+- compare throughput and peak memory of the different BibTeX parsers
+- compare throughput of the parsers for each registered format
+- generate synthetic author name variants and benchmark their normalization
+
+Usage: bib_benchmark.py [Options] [File]
+       bib_benchmark.py -s 1e3,1e4,1e5 -o results.json [-c baseline.json]
+"""
+
+import random
+import time
+import json
+import functools
+import itertools
+import os
+import platform
+import resource
+import tempfile
+import multiprocessing
+import bib_parser
+import bib_authors
+import bib_analyzer
+import bib_export
+from bib_model import BibCorpus
+
+# some words for generating random titles and author names
+WORDS = ("agent", "multi", "petri", "net", "model", "driven", "process",
+         "simulation", "semantic", "web", "service", "learning", "planning",
+         "negotiation", "ontology", "framework", "approach", "analysis",
+         "towards", "with", "for", "of", "the", "a", "and", "using", "on")
+FIRST_NAMES = ("Tobias", "Marco", "Axel", "Sahin", "Anna", "Julia", "Jan",
+               "Christian", "Nils", "Maria", "Frank", "Sebastian", "Eva")
+LAST_NAMES = ("Küster", "Lützenberger", "Heßler", "Albayrak", "Schmidt",
+              "Müller", "Meyer", "Weber", "Wagner", "Becker", "Hoffmann")
+# syllables for generating many more distinct last names
+SYLLABLES = ("kü", "ster", "lüt", "zen", "ber", "ger", "hoff", "mann", "schmi",
+             "wa", "gner", "mey", "al", "bay", "rak", "bö", "ck", "ler", "ha")
+
+
+def make_sampler(rnd, pool, zipf=None):
+	"""Get function drawing a random element of the pool, uniformly or, if
+	zipf is given, Zipf-distributed with that exponent (first most likely).
+	"""
+	if not zipf:
+		return lambda: rnd.choice(pool)
+	cum_weights = list(itertools.accumulate(1. / (k + 1) ** zipf for k in range(len(pool))))
+	return lambda: rnd.choices(pool, cum_weights=cum_weights)[0]
+
+def make_pool(number, parts, join, seed=0):
+	"""Get list of number distinct strings, each made by join from a tuple
+	of random parts, e.g. syllables.
+	"""
+	rnd, pool = random.Random(seed), {}
+	while len(pool) < number:
+		pool.setdefault(join(rnd.choice(parts) for _ in range(rnd.randint(2, 4))), None)
+	return list(pool)
+
+def generate_items(entries, seed=0, authors=None, vocabulary=None, zipf=None):
+	"""Generate tuples (authors, title, year, month) of random bibliography
+	items, with authors as a list of names and month as a BibTeX macro.
+	- authors is the number of distinct authors; default: combinations of
+	  FIRST_NAMES and LAST_NAMES
+	- vocabulary is the number of distinct title words; default: WORDS
+	- zipf is the exponent for Zipf-distributed authors and words; default:
+	  uniform distribution
+	"""
+	rnd = random.Random(seed)
+	if authors is None and not zipf:
+		first, last = make_sampler(rnd, FIRST_NAMES), make_sampler(rnd, LAST_NAMES)
+		author = lambda: "%s %s" % (first(), last())
+	else:
+		names = ["%s %s" % (FIRST_NAMES[i % len(FIRST_NAMES)], name) for i, name in
+		         enumerate(make_pool(authors or 1000, SYLLABLES, lambda p: "".join(p).capitalize()))]
+		author = make_sampler(rnd, names, zipf)
+	words = WORDS if vocabulary is None else make_pool(vocabulary, WORDS, "-".join)
+	word = make_sampler(rnd, words, zipf)
+	for i in range(entries):
+		names = [author() for _ in range(rnd.randint(1, 4))]
+		title = " ".join(word() for _ in range(rnd.randint(3, 10)))
+		yield names, title.capitalize(), rnd.randint(1990, 2015), rnd.choice(("jan", "jun", "dec"))
+
+def generate_bibtex(filename, entries, seed=0, **config):
+	"""Write a synthetic BibTeX file with the given number of entries, using
+	random titles, authors and years, some macros and concatenations;
+	further keyword arguments are passed to generate_items.
+	"""
+	with open(filename, "w", encoding="utf8") as f:
+		f.write('@string{proc = "Proceedings of the"}\n\n')
+		for i, (authors, title, year, month) in enumerate(generate_items(entries, seed, **config)):
+			f.write("@inproceedings{entry%d,\n"
+			        "  author = {%s},\n"
+			        "  title = {{%s}},\n"
+			        "  booktitle = proc # { Workshop %d},\n"
+			        "  year = {%d},\n"
+			        "  month = %s\n"
+			        "}\n\n" % (i, " and ".join(authors), title, i % 50, year, month))
+
+def generate_list(filename, entries, seed=0):
+	"""Write a synthetic TITEL/AUTOR list with the given number of entries."""
+	with open(filename, "w", encoding="utf8") as f:
+		for authors, title, year, month in generate_items(entries, seed):
+			f.write("TITEL: %s\nAUTOR: %s\n\n" % (title, ", ".join(authors)))
+
+def generate_ris(filename, entries, seed=0):
+	"""Write a synthetic RIS file with the given number of entries."""
+	with open(filename, "w", encoding="utf8") as f:
+		for authors, title, year, month in generate_items(entries, seed):
+			f.write("TY  - CONF\n")
+			f.writelines("AU  - %s\n" % author for author in authors)
+			f.write("TI  - %s\nPY  - %d\nER  - \n\n" % (title, year))
+
+def generate_csl_json(filename, entries, seed=0):
+	"""Write a synthetic CSL-JSON file with the given number of entries."""
+	with open(filename, "w", encoding="utf8") as f:
+		json.dump([{"type": "paper-conference", "title": title,
+		            "author": [dict(zip(("given", "family"), author.split(" ", 1))) for author in authors],
+		            "issued": {"date-parts": [[year]]}}
+		           for authors, title, year, month in generate_items(entries, seed)], f)
+
+# generator functions and file extensions for benchmarking each format
+FORMAT_FILES = {"list": (generate_list, "txt"),
+                "bibtex-regex": (generate_bibtex, "bib"),
+                "bibtex": (generate_bibtex, "bib"),
+                "ris": (generate_ris, "ris"),
+                "csl-json": (generate_csl_json, "json")}
+
+def generate_names(count, seed=0):
+	"""Get list of count synthetic author names, with several variants of
+	each person's name: full name, initial, "Last, First", and umlauts
+	written as "ue" etc. Also returns the number of distinct persons.
+	"""
+	rnd = random.Random(seed)
+	persons = set()
+	while len(persons) < count // 4:
+		last = "".join(rnd.choice(SYLLABLES) for _ in range(rnd.randint(2, 4))).capitalize()
+		persons.add((rnd.choice(FIRST_NAMES), last))
+	persons = sorted(persons)
+	variants = (lambda f, l: "%s %s" % (f, l),
+	            lambda f, l: "%s. %s" % (f[0], l),
+	            lambda f, l: "%s, %s" % (l, f),
+	            lambda f, l: "%s %s" % (f, l.replace("ü", "ue").replace("ö", "oe")))
+	names = [rnd.choice(variants)(*rnd.choice(persons)) for _ in range(count)]
+	return names, len(persons)
+
+def benchmark_authors(count):
+	"""Normalize count synthetic author names; return number of names per
+	second, number of canonical names, and number of persons.
+	"""
+	names, persons = generate_names(count)
+	start = time.time()
+	mapping = bib_authors.normalize_authors(names)
+	elapsed = time.time() - start
+	return count / max(elapsed, 1e-9), len(set(mapping.values())), persons
+
+def run_parser(parse_func, filename):
+	"""Parse the file with the given function and return number of entries,
+	elapsed time, and peak memory (resident set size, in kB).
+	"""
+	start = time.time()
+	count = sum(1 for _ in parse_func(filename))
+	elapsed = time.time() - start
+	return count, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+def benchmark_parser(parse_func, filename):
+	"""Run the parser in a separate process, so peak memory is measured
+	independently for each parser; return number of entries, entries per
+	second and peak memory (kB).
+	"""
+	with multiprocessing.Pool(1) as pool:
+		count, elapsed, peak = pool.apply(run_parser, (parse_func, filename))
+	return count, count / max(elapsed, 1e-9), peak
+
+
+def benchmark_pipeline(filename, entries, outdir):
+	"""Parse the file and run each analyzer function and the graph export on
+	the items; return list of results, each a dict with the stage, number of
+	entries, seconds, entries per second, and peak memory (MB) so far. The
+	corpus's cache is cleared before each stage, so that no stage just reuses
+	e.g. the title tokens of the one before.
+	"""
+	results = []
+	items = None
+	def timed(stage, func):
+		if items is not None:
+			items.cache.clear()
+		start = time.time()
+		result = func()
+		elapsed = time.time() - start
+		results.append({"stage": stage, "entries": entries, "seconds": elapsed,
+		                "entries_per_second": entries / max(elapsed, 1e-9),
+		                "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.})
+		return result
+
+	items = timed("parse", lambda: BibCorpus(bib_parser.parse_bib_from_bibtex(filename)))
+	timed("iter_authors", lambda: sum(1 for _ in bib_analyzer.iter_authors(items)))
+	timed("iter_titles", lambda: sum(1 for _ in bib_analyzer.iter_titles(items)))
+	coauthors = timed("get_coauthors", lambda: bib_analyzer.get_coauthors(items))
+	timed("get_papers_per_author", lambda: bib_analyzer.get_papers_per_author(items))
+	timed("get_title_words", lambda: sum(len(bib_analyzer.get_title_words(title))
+	                                     for title in items.iter_titles()))
+	timed("get_title_ngrams", lambda: bib_analyzer.get_title_ngrams(items, 2))
+	topic = items.get_title(0).split()[0].lower() if len(items) else "agent"
+	timed("get_authors_for_topic", lambda: bib_analyzer.get_authors_for_topic(items, topic))
+	timed("export_graph", lambda: bib_export.export_graph(coauthors, os.path.join(outdir, "graph.dot")))
+	return results
+
+def run_suite(sizes, **config):
+	"""Generate BibTeX files with the given numbers of entries (keyword
+	arguments are passed to generate_items) and run benchmark_pipeline for
+	each of them in a separate process; return list of all results.
+	"""
+	results = []
+	with tempfile.TemporaryDirectory() as outdir:
+		for entries in sizes:
+			filename = os.path.join(outdir, "benchmark.bib")
+			generate_bibtex(filename, entries, **config)
+			with multiprocessing.Pool(1) as pool:
+				results.extend(pool.apply(benchmark_pipeline, (filename, entries, outdir)))
+	return results
+
+def compare_results(results, baseline, tolerance=0.2):
+	"""Compare results to baseline results, as returned by run_suite; return
+	list of (stage, entries, old seconds, new seconds) for all stages that
+	are more than tolerance (relative) slower than in the baseline.
+	"""
+	old = {(r["stage"], r["entries"]): r["seconds"] for r in baseline}
+	return [(r["stage"], r["entries"], old[r["stage"], r["entries"]], r["seconds"])
+	        for r in results if (r["stage"], r["entries"]) in old
+	        and r["seconds"] > old[r["stage"], r["entries"]] * (1 + tolerance)]
+
+
+def main():
+	"""Parse command line options and run parser benchmarks.
+	"""
+	import optparse
+	import sys
+
+	parser = optparse.OptionParser("bib_benchmark.py [Options] [File]")
+	parser.add_option("-n", "--entries", dest="entries", type="int", default=100000,
+	                  help="number of entries for generated BibTeX file")
+	parser.add_option("-a", "--authors", dest="authors", type="int", default=0,
+	                  help="benchmark normalization of this many author names instead")
+	parser.add_option("-f", "--formats", dest="formats", action="store_true", default=False,
+	                  help="benchmark parsers of all registered formats instead")
+	parser.add_option("-s", "--sizes", dest="sizes", default=None,
+	                  help="benchmark whole pipeline instead, for these comma-separated numbers of entries")
+	parser.add_option("--num-authors", dest="num_authors", type="int", default=None,
+	                  help="number of distinct authors in generated entries")
+	parser.add_option("--vocabulary", dest="vocabulary", type="int", default=None,
+	                  help="number of distinct title words in generated entries")
+	parser.add_option("--zipf", dest="zipf", type="float", default=None,
+	                  help="Zipf exponent for distribution of authors and words")
+	parser.add_option("-o", "--output", dest="output", default=None,
+	                  help="save pipeline benchmark results to this JSON file")
+	parser.add_option("-c", "--compare", dest="compare", default=None,
+	                  help="compare pipeline benchmark results to this JSON file")
+	parser.add_option("-t", "--tolerance", dest="tolerance", type="float", default=0.2,
+	                  help="relative slowdown reported as regression")
+	(options, args) = parser.parse_args()
+
+	if options.sizes:
+		sizes = [int(float(size)) for size in options.sizes.split(",")]
+		results = run_suite(sizes, authors=options.num_authors,
+		                    vocabulary=options.vocabulary, zipf=options.zipf)
+		for r in results:
+			print("%-22s %9d entries %8.3f s %12.0f entries/s %10.1f MB peak RSS"
+			      % (r["stage"], r["entries"], r["seconds"], r["entries_per_second"], r["peak_rss_mb"]))
+		if options.output:
+			with open(options.output, "w") as f:
+				json.dump({"python": platform.python_version(), "time": time.time(),
+				           "config": vars(options), "results": results}, f, indent=1)
+		if options.compare:
+			with open(options.compare) as f:
+				regressions = compare_results(results, json.load(f)["results"], options.tolerance)
+			for stage, entries, old, new in regressions:
+				print("REGRESSION: %s with %d entries: %.3f s -> %.3f s" % (stage, entries, old, new))
+			if regressions:
+				sys.exit(1)
+		return
+
+	if options.formats:
+		with tempfile.TemporaryDirectory() as tempdir:
+			for name in bib_parser.FORMATS:
+				generate, extension = FORMAT_FILES[name]
+				filename = os.path.join(tempdir, "benchmark.%s" % extension)
+				generate(filename, options.entries)
+				parse_func = functools.partial(bib_parser.parse_file, format_name=name)
+				count, rate, peak = benchmark_parser(parse_func, filename)
+				print("%-12s %9d entries %12.0f entries/s %10.1f MB peak RSS"
+				      % (name, count, rate, peak / 1024.))
+		return
+
+	if options.authors:
+		rate, canonical, persons = benchmark_authors(options.authors)
+		print("%d names: %.0f names/s, %d canonical names for %d persons"
+		      % (options.authors, rate, canonical, persons))
+		return
+
+	with tempfile.TemporaryDirectory() as tempdir:
+		filename = args[0] if args else os.path.join(tempdir, "benchmark.bib")
+		if not args:
+			generate_bibtex(filename, options.entries)
+		print("File: %s (%.1f MB)" % (filename, os.path.getsize(filename) / 2.**20))
+
+		parsers = [("regex", bib_parser.parse_bib_from_bibtex_regex),
+		           ("streaming", bib_parser.parse_bib_from_bibtex)]
+		for name, parse_func in parsers:
+			count, rate, peak = benchmark_parser(parse_func, filename)
+			print("%-10s %9d entries %12.0f entries/s %10.1f MB peak RSS"
+			      % (name, count, rate, peak / 1024.))
+
+if __name__ == "__main__":
+	main()
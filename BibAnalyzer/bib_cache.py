@@ -0,0 +1,103 @@
+# -*- coding: utf8 -*-
+
+"""Cache module for Bibliography Analyzer Utility.
+by Tobias Küster, 2015
+
+- store parsed bibliography items in a compact, columnar cache file, as BibCorpus
+- reuse the cache as long as the BibTeX file's size, mtime or content match
+- if the BibTeX file was only appended to, parse just the new entries
+"""
+
+import hashlib
+import io
+import os
+import pickle
+import bib_parser
+from bib_model import BibCorpus
+
+# version of the cache format; caches with different version are discarded
+CACHE_VERSION = 4
+
+# size of the blocks read when hashing the BibTeX file
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def cache_filename(filename):
+	"""Get default name of the cache file for the given BibTeX file."""
+	return filename + ".cache"
+
+def hash_file(filename, prefix_size=None):
+	"""Get SHA-1 hex digest of the file's content, and of the first
+	prefix_size bytes of the file (None if prefix_size is not given or
+	larger than the file).
+	"""
+	sha, prefix, pos = hashlib.sha1(), None, 0
+	with open(filename, "rb") as f:
+		for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+			if prefix_size is not None and pos <= prefix_size < pos + len(block):
+				head = sha.copy()
+				head.update(block[:prefix_size - pos])
+				prefix = head.hexdigest()
+			sha.update(block)
+			pos += len(block)
+	if prefix_size == pos:
+		prefix = sha.hexdigest()
+	return sha.hexdigest(), prefix
+
+def load_cache(cache_file):
+	"""Load cache file, or return None if it does not exist or is outdated."""
+	try:
+		with open(cache_file, "rb") as f:
+			cache = pickle.load(f)
+		return cache if cache.get("version") == CACHE_VERSION else None
+	except (IOError, OSError, EOFError, pickle.UnpicklingError):
+		return None
+
+def save_cache(cache_file, cache):
+	"""Write cache file, replacing the old one only after writing completed."""
+	with open(cache_file + ".tmp", "wb") as f:
+		pickle.dump(cache, f, pickle.HIGHEST_PROTOCOL)
+	os.replace(cache_file + ".tmp", cache_file)
+
+def parse_bib_cached(filename, cache_file=None):
+	"""Parse list of bibliography items from Bibtex file, using a cache.
+	- filename is the name of the BibTeX file
+	- cache_file is the name of the cache file; default: <filename>.cache
+	- returns BibCorpus holding the items
+	If size and mtime of the file did not change, the items are read from the
+	cache without even looking at the file. Otherwise, the file's hash is
+	compared to the cache's; if the cached part is unchanged and only new
+	entries were appended, only those are parsed, using the cached macros.
+	"""
+	cache_file = cache_file or cache_filename(filename)
+	path, stat = os.path.abspath(filename), os.stat(filename)
+	cache = load_cache(cache_file)
+	if cache and cache["path"] != path:
+		cache = None
+	if cache and (cache["size"], cache["mtime"]) == (stat.st_size, stat.st_mtime):
+		return cache["corpus"]
+
+	digest, prefix = hash_file(filename, cache and cache["size"])
+	if cache and cache["hash"] == prefix and cache["hash"] != digest:
+		corpus, macros = cache["corpus"], cache["macros"]
+		with open(filename, "rb") as f:
+			f.seek(cache["size"])
+			corpus.extend(bib_parser.parse_bibtex_stream(io.TextIOWrapper(f, encoding="utf8"), macros))
+	elif not cache or cache["hash"] != digest:
+		macros = dict(bib_parser.MONTH_MACROS)
+		with open(filename, encoding="utf8") as f:
+			corpus = BibCorpus(bib_parser.parse_bibtex_stream(f, macros))
+		cache = dict(corpus=corpus, macros=macros)
+
+	cache.update(version=CACHE_VERSION, path=path, hash=digest,
+	             size=stat.st_size, mtime=stat.st_mtime)
+	save_cache(cache_file, cache)
+	return cache["corpus"]
+
+
+# just for testing...
+if __name__ == "__main__":
+	import time
+	start = time.time()
+	items = parse_bib_cached("literature.bib")
+	print("%d items in %.3f s" % (len(items), time.time() - start))
@@ -0,0 +1,161 @@
+# -*- coding: utf8 -*-
+
+"""Graph export module for Bibliography Analyzer Utility.
+by Tobias Küster, 2015
+
+- prune co-author graph by edge weight, top authors, k-core, or ego network
+- stream co-author edges to GraphViz DOT, GraphML or JSON files
+- optionally render the exported graph, e.g. using GraphViz
+"""
+
+import json
+import subprocess
+from collections import Counter
+from xml.sax.saxutils import quoteattr
+from bib_graph import CoauthorGraph
+
+# size of the output buffer used by the writers
+BUFFER_SIZE = 1 << 20
+
+
+def prune(coauthors, min_weight=1, k_core=None, ego=None, radius=1, top=None):
+	"""Get subset of the co-author pairs, keeping only
+	- pairs with at least min_weight joint papers
+	- then, if k_core is given, pairs in the k-core of the graph
+	- then, if ego is given, pairs within radius co-authors of that author
+	- then, if top is given, pairs among the top authors by joint papers
+	"""
+	coauthors = {pair: num for pair, num in coauthors.items() if num >= min_weight}
+	if k_core is not None:
+		authors = CoauthorGraph(coauthors).k_core(k_core)
+		coauthors = keep_authors(coauthors, authors)
+	if ego is not None:
+		coauthors = keep_authors(coauthors, ego_network(coauthors, ego, radius))
+	if top is not None:
+		weights = Counter()
+		for (a1, a2), num in coauthors.items():
+			weights[a1] += num
+			weights[a2] += num
+		coauthors = keep_authors(coauthors, {a for a, _ in weights.most_common(top)})
+	return coauthors
+
+def keep_authors(coauthors, authors):
+	"""Get the co-author pairs having both authors in the given set."""
+	return {(a1, a2): num for (a1, a2), num in coauthors.items()
+	        if a1 in authors and a2 in authors}
+
+def ego_network(coauthors, author, radius=1):
+	"""Get set of authors at most radius co-authors away from the author."""
+	graph = CoauthorGraph(coauthors)
+	if author not in graph.ids:
+		return {author}
+	seen = {graph.ids[author]}
+	frontier = list(seen)
+	for _ in range(radius):
+		frontier = [u for v in frontier for u in graph.neighbors(v) if u not in seen]
+		seen.update(frontier)
+	return {graph.names[v] for v in seen}
+
+
+def dot_string(string):
+	"""Get string as quoted DOT identifier."""
+	return '"%s"' % string.replace("\\", "\\\\").replace('"', '\\"')
+
+def write_dot(f, coauthors):
+	"""Write co-author graph in GraphViz DOT format."""
+	f.write('graph "Co-Authors" {')
+	for (a1, a2), num in coauthors.items():
+		style = (' [style="bold" label="x%d"]' % num) if num > 1 else ''
+		f.write('\n\t %s -- %s %s;' % (dot_string(a1), dot_string(a2), style))
+	f.write("}\n")
+
+def write_graphml(f, coauthors):
+	"""Write co-author graph in GraphML format, with author names as node IDs
+	and the number of joint papers as edge weights.
+	"""
+	f.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+	        '<graphml xmlns="http://graphml.graphdrawing.org/xmlns">\n'
+	        '<key id="weight" for="edge" attr.name="weight" attr.type="int"/>\n'
+	        '<graph id="Co-Authors" edgedefault="undirected">\n')
+	authors = sorted({author for pair in coauthors for author in pair})
+	f.writelines('<node id=%s/>\n' % quoteattr(author) for author in authors)
+	f.writelines('<edge source=%s target=%s><data key="weight">%d</data></edge>\n'
+	             % (quoteattr(a1), quoteattr(a2), num) for (a1, a2), num in coauthors.items())
+	f.write('</graph>\n</graphml>\n')
+
+def write_json(f, coauthors):
+	"""Write co-author graph as JSON, with a list of author names as "nodes"
+	and a list of {"source", "target", "weight"} as "links".
+	"""
+	authors = sorted({author for pair in coauthors for author in pair})
+	f.write('{"nodes": [')
+	f.write(", ".join(json.dumps(author) for author in authors))
+	f.write('],\n"links": [')
+	sep = "\n"
+	for (a1, a2), num in coauthors.items():
+		f.write('%s{"source": %s, "target": %s, "weight": %d}' % (sep, json.dumps(a1), json.dumps(a2), num))
+		sep = ",\n"
+	f.write("\n]}\n")
+
+# writer functions by format name, also used as file extensions
+FORMATS = {"dot": write_dot, "gv": write_dot, "graphml": write_graphml, "json": write_json}
+
+
+def export_graph(coauthors, filename, fmt=None, **pruning):
+	"""Write (pruned) co-author graph to file.
+	- coauthors is a dict mapping pairs of authors to number of joint papers
+	- fmt is one of FORMATS; by default, it is taken from the file extension
+	- further keyword arguments are passed to prune
+	- returns the number of exported edges
+	"""
+	if fmt is None:
+		fmt = filename.rsplit(".", 1)[-1].lower()
+	if fmt not in FORMATS:
+		raise ValueError("Unknown graph format: %s" % fmt)
+	if pruning:
+		coauthors = prune(coauthors, **pruning)
+	with open(filename, "w", encoding="utf8", buffering=BUFFER_SIZE) as f:
+		FORMATS[fmt](f, coauthors)
+	return len(coauthors)
+
+def render_graph(filename, renderer):
+	"""Call renderer (command line, e.g. "dot -Tps -o graph.ps") on the file."""
+	return subprocess.call(renderer.split() + [filename])
+
+
+def main():
+	"""Parse command line options and export co-author graph."""
+	from optparse import OptionParser
+	import bib_analyzer, bib_cache
+
+	parser = OptionParser("bib_export.py [Options] <file.bib>")
+	parser.add_option("-o", "--output", dest="output", default="authors_graph.dot",
+	                  help="output file; format taken from extension (%s)" % ", ".join(sorted(FORMATS)))
+	parser.add_option("-f", "--format", dest="fmt", default=None,
+	                  help="output format, if not taken from file extension")
+	parser.add_option("-w", "--min-weight", dest="min_weight", type="int", default=1,
+	                  help="minimum number of joint papers per edge")
+	parser.add_option("-k", "--core", dest="k_core", type="int", default=None,
+	                  help="keep only the k-core of the graph")
+	parser.add_option("-e", "--ego", dest="ego", default=None,
+	                  help="keep only the ego network of this author")
+	parser.add_option("-r", "--radius", dest="radius", type="int", default=1,
+	                  help="radius of the ego network")
+	parser.add_option("-t", "--top", dest="top", type="int", default=None,
+	                  help="keep only the top authors by joint papers")
+	parser.add_option("-R", "--render", dest="renderer", default=None,
+	                  help='renderer called with the output file, e.g. "dot -Tpdf -o graph.pdf"')
+	(options, args) = parser.parse_args()
+	if len(args) != 1:
+		parser.error("Expected exactly one bib file")
+
+	coauthors = bib_analyzer.get_coauthors(bib_cache.parse_bib_cached(args[0]))
+	num = export_graph(coauthors, options.output, options.fmt, min_weight=options.min_weight,
+	                   k_core=options.k_core, ego=options.ego, radius=options.radius, top=options.top)
+	print("Exported %d of %d edges to %s" % (num, len(coauthors), options.output))
+	if options.renderer:
+		render_graph(options.output, options.renderer)
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,276 @@
+# -*- coding: utf8 -*-
+
+"""Graph module for Bibliography Analyzer Utility.
+by Tobias Küster, 2015
+
+- co-author graph in compressed sparse row format, built from co-author counts
+- connected components, k-cores and maximal cliques ("author cliques")
+- degree and betweenness centrality
+- shortest collaboration paths between authors
+"""
+
+import random
+from array import array
+from bisect import bisect_left
+import bib_analyzer
+
+
+class CoauthorGraph:
+	"""Undirected, weighted co-author graph.
+
+	Authors are numbered by their position in the sorted list of names. The
+	neighbors of author v are indices[indptr[v]:indptr[v+1]], sorted by ID,
+	and the number of joint papers are in the same range of weights. Query
+	methods take and return author names; IDs are only used internally.
+	"""
+
+	def __init__(self, coauthors):
+		"""Create graph from a dict mapping pairs of authors to the number of
+		papers they wrote together, as returned by get_coauthors.
+		"""
+		self.names = sorted({author for pair in coauthors for author in pair})
+		self.ids = {name: i for i, name in enumerate(self.names)}
+		n, ids = len(self.names), self.ids
+
+		# encode both directions of each edge with weight as one sortable int;
+		# authors listed twice in one item would make self-loops, skip those
+		edges = []
+		for (a, b), num in coauthors.items():
+			if a == b:
+				continue
+			u, v = ids[a], ids[b]
+			edges.append((u * n + v) << 32 | num)
+			edges.append((v * n + u) << 32 | num)
+		edges.sort()
+		self.indptr = array("Q", (bisect_left(edges, v * n << 32) for v in range(n)))
+		self.indptr.append(len(edges))
+		self.indices = array("I", ((e >> 32) % n for e in edges))
+		self.weights = array("I", (e & 0xFFFFFFFF for e in edges))
+
+	@classmethod
+	def from_items(cls, bibitems):
+		"""Create co-author graph for the given bibliography items."""
+		return cls(bib_analyzer.get_coauthors(bibitems))
+
+	def __len__(self):
+		return len(self.names)
+
+	def num_edges(self):
+		"""Get number of (undirected) edges."""
+		return len(self.indices) // 2
+
+	def neighbors(self, v):
+		"""Get IDs of the co-authors of the author with ID v."""
+		return self.indices[self.indptr[v]:self.indptr[v+1]]
+
+	def degree_centrality(self, weighted=False):
+		"""Get number of co-authors (or of joint papers, if weighted) for each
+		author, normalized by the number of other authors if not weighted.
+		"""
+		n, indptr = len(self), self.indptr
+		if weighted:
+			return {name: sum(self.weights[indptr[v]:indptr[v+1]])
+			        for v, name in enumerate(self.names)}
+		norm = 1. / max(n - 1, 1)
+		return {name: (indptr[v+1] - indptr[v]) * norm for v, name in enumerate(self.names)}
+
+	def components(self):
+		"""Get connected components, as lists of author names, largest first.
+		"""
+		seen = bytearray(len(self))
+		components = []
+		for start in range(len(self)):
+			if not seen[start]:
+				seen[start] = 1
+				component = [start]
+				for v in component:
+					for u in self.neighbors(v):
+						if not seen[u]:
+							seen[u] = 1
+							component.append(u)
+				components.append(component)
+		components.sort(key=len, reverse=True)
+		return [[self.names[v] for v in component] for component in components]
+
+	def _cores(self):
+		"""Get core number of each author and degeneracy ordering of authors,
+		using the O(m) algorithm by Batagelj and Zaversnik.
+		"""
+		n, indptr = len(self), self.indptr
+		core = [indptr[v+1] - indptr[v] for v in range(n)]
+		bins = [0] * (max(core, default=0) + 1)
+		for d in core:
+			bins[d] += 1
+		start = 0
+		for d, num in enumerate(bins):
+			bins[d], start = start, start + num
+		pos, order = [0] * n, [0] * n
+		for v in range(n):
+			pos[v] = bins[core[v]]
+			order[pos[v]] = v
+			bins[core[v]] += 1
+		bins.insert(0, 0)
+		for v in order:
+			for u in self.neighbors(v):
+				if core[u] > core[v]:
+					du, pu = core[u], pos[u]
+					pw = bins[du]
+					w = order[pw]
+					if u != w:
+						pos[u], pos[w] = pw, pu
+						order[pu], order[pw] = w, u
+					bins[du] += 1
+					core[u] -= 1
+		return core, order
+
+	def core_numbers(self):
+		"""Get core number for each author, i.e. the largest k such that the
+		author is part of the k-core.
+		"""
+		core, _ = self._cores()
+		return dict(zip(self.names, core))
+
+	def k_core(self, k):
+		"""Get set of authors in the k-core, i.e. the largest subgraph in which
+		each author has at least k co-authors.
+		"""
+		core, _ = self._cores()
+		return {self.names[v] for v in range(len(self)) if core[v] >= k}
+
+	def cliques(self, min_size=3):
+		"""Iterate maximal cliques with at least min_size authors, as lists of
+		author names, using Bron-Kerbosch with pivoting in degeneracy order.
+		"""
+		neighbor_sets = {}
+		def adjacent(v):
+			if v not in neighbor_sets:
+				neighbor_sets[v] = set(self.neighbors(v))
+			return neighbor_sets[v]
+
+		def expand(clique, candidates, excluded):
+			if not candidates and not excluded:
+				if len(clique) >= min_size:
+					yield [self.names[v] for v in clique]
+				return
+			if len(clique) + len(candidates) < min_size:
+				return
+			pivot = max(candidates | excluded, key=lambda u: len(candidates & adjacent(u)))
+			for v in list(candidates - adjacent(pivot)):
+				yield from expand(clique + [v], candidates & adjacent(v), excluded & adjacent(v))
+				candidates.discard(v)
+				excluded.add(v)
+
+		_, order = self._cores()
+		position = {v: i for i, v in enumerate(order)}
+		for v in order:
+			later = {u for u in adjacent(v) if position[u] > position[v]}
+			yield from expand([v], later, adjacent(v) - later)
+			neighbor_sets.pop(v, None)
+
+	def betweenness(self, samples=None, seed=None):
+		"""Get betweenness centrality of each author, using Brandes' algorithm.
+		For large graphs, the number of source nodes can be limited to a random
+		sample of the given size, and the result is extrapolated accordingly.
+		"""
+		n = len(self)
+		sources = range(n)
+		if samples is not None and samples < n:
+			sources = random.Random(seed).sample(range(n), samples)
+		centrality = [0.] * n
+		for s in sources:
+			dist, sigma = [-1] * n, [0] * n
+			dist[s], sigma[s] = 0, 1
+			stack = [s]
+			for v in stack:
+				d, num = dist[v] + 1, sigma[v]
+				for u in self.neighbors(v):
+					if dist[u] < 0:
+						dist[u] = d
+						stack.append(u)
+					if dist[u] == d:
+						sigma[u] += num
+			delta = [0.] * n
+			for w in reversed(stack):
+				d, coeff = dist[w] - 1, (1 + delta[w]) / sigma[w]
+				for v in self.neighbors(w):
+					if dist[v] == d:
+						delta[v] += sigma[v] * coeff
+				if w != s:
+					centrality[w] += delta[w]
+		scale = 0.5 * n / max(len(sources), 1)
+		return {name: c * scale for name, c in zip(self.names, centrality)}
+
+	def shortest_path(self, source, target):
+		"""Get shortest chain of co-authors from source to target author, as
+		list of names, or None if there is none; using bidirectional BFS.
+		Authors without co-authors are not in the graph, but are not an error.
+		"""
+		if source == target:
+			return [source]
+		if source not in self.ids or target not in self.ids:
+			return None
+		s, t = self.ids[source], self.ids[target]
+		parents = ({s: None}, {t: None})
+		frontiers = ([s], [t])
+		while frontiers[0] and frontiers[1]:
+			side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+			own, other = parents[side], parents[1 - side]
+			frontier, meetings = [], []
+			for v in frontiers[side]:
+				for u in self.neighbors(v):
+					if u not in own:
+						own[u] = v
+						frontier.append(u)
+						if u in other:
+							meetings.append(u)
+			if meetings:
+				meet = min(meetings, key=lambda u: self._depth(other, u))
+				path = self._trace(parents[0], meet)[::-1] + self._trace(parents[1], meet)[1:]
+				return [self.names[v] for v in path]
+			frontiers = (frontier, frontiers[1]) if side == 0 else (frontiers[0], frontier)
+		return None
+
+	def _trace(self, parents, v):
+		"""Follow BFS parent links from v back to the search's start."""
+		path = [v]
+		while parents[path[-1]] is not None:
+			path.append(parents[path[-1]])
+		return path
+
+	def _depth(self, parents, v):
+		"""Get distance of v to the BFS search's start."""
+		return len(self._trace(parents, v)) - 1
+
+
+# testing
+if __name__ == "__main__":
+	from pprint import pprint
+	import bib_cache
+	import bib_benchmark
+	from bib_model import BibItem
+
+	def brute_force_cliques(graph, min_size):
+		"""Enumerate all cliques by extending them with higher IDs only, and
+		keep those that no other author is adjacent to all members of.
+		"""
+		adjacent = [set(graph.neighbors(v)) for v in range(len(graph))]
+		cliques, stack = [], [([v], adjacent[v]) for v in range(len(graph))]
+		while stack:
+			clique, common = stack.pop()
+			if not common and len(clique) >= min_size:
+				cliques.append(sorted(graph.names[v] for v in clique))
+			stack.extend((clique + [u], common & adjacent[u]) for u in common if u > clique[-1])
+		return sorted(cliques)
+
+	# compare cliques with brute force on synthetic items, with duplicate authors
+	items = [BibItem(authors, title, year) for authors, title, year, _ in
+	         bib_benchmark.generate_items(3000, zipf=1.1, authors=300)]
+	graph = CoauthorGraph.from_items(items)
+	cliques = sorted(sorted(c) for c in graph.cliques(3))
+	print("%d cliques, same as brute force: %s" % (len(cliques), cliques == brute_force_cliques(graph, 3)))
+
+	graph = CoauthorGraph.from_items(bib_cache.parse_bib_cached("literature.bib"))
+	print("%d authors, %d edges" % (len(graph), graph.num_edges()))
+	pprint([len(c) for c in graph.components()])
+	pprint(sorted(graph.cliques(4), key=len, reverse=True)[:10])
+	pprint(sorted(graph.betweenness(samples=100).items(), key=lambda x: x[1])[-10:])
@@ -0,0 +1,100 @@
+# -*- coding: utf8 -*-
+
+"""Incremental analysis for Bibliography Analyzer Utility.
+by Tobias Küster, 2015
+
+- keep co-author, paper, n-gram and topic counts for a changing set of items
+- update the counts in O(delta) when items are added or removed
+"""
+
+from itertools import combinations
+from collections import Counter, defaultdict
+from bib_analyzer import WORDS_PATTERN, get_title_words
+from bib_tokens import normalize_word
+from bib_ngrams import iter_ngrams
+
+
+class IncrementalAnalyzer:
+	"""Analyzer state that is updated as items are added or removed.
+
+	The query methods return the same results as the according functions in
+	bib_analyzer applied to all the items currently added, but without
+	scanning those items again. The maximum n-gram order and stemming are
+	fixed when creating the analyzer.
+	"""
+
+	def __init__(self, bibitems=(), n=1, stemming=False):
+		"""Create analyzer for n-grams of order 1 up to n and add the items."""
+		self.n = n
+		self.stemming = stemming
+		self.items = Counter()
+		self.coauthors = Counter()
+		self.papers = Counter()
+		self.ngrams = Counter()
+		self.topics = defaultdict(Counter)   # normalized word -> author -> papers
+		self.bad_topics = defaultdict(Counter)  # bad word -> author -> papers
+		self.add(bibitems)
+
+	def __len__(self):
+		return sum(self.items.values())
+
+	def add(self, bibitems):
+		"""Add the given items and update all counts."""
+		for item in bibitems:
+			self._update(item, +1)
+
+	def remove(self, bibitems):
+		"""Remove the given items, which have to have been added before, and
+		update all counts.
+		"""
+		for item in bibitems:
+			if not self.items[item]:
+				del self.items[item]
+				raise ValueError("Item has not been added: %s" % item)
+			self._update(item, -1)
+
+	def _update(self, item, delta):
+		"""Add (delta = +1) or remove (delta = -1) a single item."""
+		authors = item.authors
+		self._count(self.items, (item,), delta)
+		self._count(self.coauthors, (tuple(sorted(pair)) for pair in combinations(authors, 2)), delta)
+		self._count(self.papers, authors, delta)
+		self._count(self.ngrams, iter_ngrams(get_title_words(item.title, self.stemming), self.n), delta)
+		for word in set(WORDS_PATTERN.findall(item.title.lower())):
+			normalized = normalize_word(word, self.stemming)
+			topics = self.bad_topics if normalized is None else self.topics
+			key = word if normalized is None else normalized
+			self._count(topics[key], authors, delta)
+			if not topics[key]:
+				del topics[key]
+
+	def _count(self, counter, keys, delta):
+		"""Add delta to the counts of the keys, dropping counts reaching zero."""
+		for key in keys:
+			counter[key] += delta
+			if not counter[key]:
+				del counter[key]
+
+	def get_coauthors(self):
+		"""Get number of papers co-authored together for each pair of co-authors.
+		"""
+		return dict(self.coauthors)
+
+	def get_papers_per_author(self, min_num=1):
+		"""Get the number of papers each author has written.
+		"""
+		return {author: num for author, num in self.papers.items() if num >= min_num}
+
+	def get_title_ngrams(self, min_num=1):
+		"""Get all n-grams from 1 up to n for the title words in the papers.
+		"""
+		return {" ".join(key): val for key, val in self.ngrams.items() if val >= min_num}
+
+	def get_authors_for_topic(self, topic):
+		"""Get all authors writing about a certain topic, i.e. having the topic
+		word (stemmed, if stemming is used) in the title.
+		"""
+		normalized = normalize_word(topic, self.stemming)
+		if normalized is None:
+			return set(self.bad_topics.get(topic, ()))
+		return set(self.topics.get(normalized, ()))
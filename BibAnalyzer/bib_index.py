@@ -0,0 +1,149 @@
+# -*- coding: utf8 -*-
+
+"""Index module for Bibliography Analyzer Utility.
+by Tobias Küster, 2015
+
+- inverted index from stemmed title words to the items using them
+- boolean AND/OR and phrase queries, optionally restricted to a range of years
+- save index to and load index from file
+"""
+
+import pickle
+import re
+from array import array
+from bisect import bisect_left
+from bib_analyzer import get_title_words
+from bib_model import BibCorpus, packed_year
+from bib_tokens import get_title_tokens
+
+# query syntax: phrases in quotes, other terms separated by whitespace
+QUERY_PATTERN = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def contains(postings, item_id):
+	"""Check whether sorted postings array contains the item ID."""
+	pos = bisect_left(postings, item_id)
+	return pos < len(postings) and postings[pos] == item_id
+
+def intersect(postings):
+	"""Get sorted list of item IDs contained in all of the sorted postings.
+	If the shortest postings are much shorter than the others, its items are
+	looked up in the others using binary search, otherwise sets are used.
+	"""
+	if len(postings) < 2:
+		return list(postings[0]) if postings else []
+	postings = sorted(postings, key=len)
+	if len(postings[0]) * 16 < len(postings[1]):
+		return [item_id for item_id in postings[0]
+		        if all(contains(other, item_id) for other in postings[1:])]
+	return sorted(set(postings[0]).intersection(*postings[1:]))
+
+
+class TopicIndex:
+	"""Inverted index for the title words of bibliography items.
+
+	Items are identified by their position in the list (or corpus) of items
+	the index was created for. For each stemmed title word, the index holds a
+	sorted array of the items using that word; for each item, it holds the
+	sequence of word IDs in its title, used for checking phrases, and the year.
+	"""
+
+	def __init__(self, bibitems):
+		"""Create index for the given bibliography items."""
+		if not isinstance(bibitems, BibCorpus):
+			bibitems = list(bibitems)
+		self.tokens = get_title_tokens(bibitems, stemming=True)
+		self.postings = [array("I") for _ in self.tokens.words]
+		for item_id, word_ids in enumerate(self.tokens.titles):
+			for word_id in set(word_ids):
+				self.postings[word_id].append(item_id)
+		self.years = array("H", (packed_year(item.year) for item in bibitems))
+
+	def __len__(self):
+		return len(self.years)
+
+	def lookup(self, word):
+		"""Get sorted array of items whose title contains the given word,
+		after stemming it just like the title words. For a BibCorpus, the
+		tokens are shared with the corpus and may know words added later,
+		which are not in the index.
+		"""
+		word_ids = self.tokens.tokenize(word)
+		if len(word_ids) != 1 or word_ids[0] >= len(self.postings):
+			return array("I")
+		return self.postings[word_ids[0]]
+
+	def all_of(self, words):
+		"""Get sorted list of items whose titles contain all the words; bad
+		words are ignored, as they are not in the index.
+		"""
+		return intersect([self.lookup(word) for word in words
+		                  if get_title_words(word, stemming=True)])
+
+	def any_of(self, words):
+		"""Get sorted list of items whose titles contain any of the words."""
+		return sorted(set().union(*(self.lookup(word) for word in words)))
+
+	def phrase(self, text):
+		"""Get sorted list of items whose titles contain the phrase, i.e. the
+		(stemmed) words in that order, ignoring bad words like in the index.
+		"""
+		words = get_title_words(text, stemming=True)
+		word_ids = self.tokens.tokenize(text)
+		if not words or len(word_ids) != len(words) or max(word_ids) >= len(self.postings):
+			return []
+		n, titles = len(word_ids), self.tokens.titles
+		return [item_id for item_id in intersect([self.postings[i] for i in word_ids])
+		        if any(titles[item_id][k:k+n] == word_ids
+		               for k in range(len(titles[item_id]) - n + 1))]
+
+	def search(self, query, years=None):
+		"""Get sorted list of items matching the query. The query consists of
+		clauses separated by "OR"; each clause consists of words and phrases in
+		quotes, all of which have to be in the title ("AND" is optional); bad
+		words, which are not in the index, are ignored.
+		- years is a tuple (first, last) to restrict the items to; either of
+		  them can be None; items without year, or with a year that is no
+		  number or out of range, are excluded then
+		"""
+		clauses = [intersect([self.phrase(phrase) if phrase else self.lookup(word)
+		                      for phrase, word in QUERY_PATTERN.findall(clause)
+		                      if word != "AND" and get_title_words(phrase or word, stemming=True)])
+		           for clause in re.split(r"\s+OR\s+", query)]
+		results = clauses[0] if len(clauses) == 1 else sorted(set().union(*clauses))
+		if years:
+			first, last = years
+			results = [item_id for item_id in results if self.years[item_id]
+			           and (first is None or self.years[item_id] >= first)
+			           and (last is None or self.years[item_id] <= last)]
+		return results
+
+	def get_authors(self, item_ids, bibitems):
+		"""Get all authors of the given items; bibitems have to be the items
+		the index was created for.
+		"""
+		if not hasattr(bibitems, "__getitem__"):
+			bibitems = list(bibitems)
+		authors = set()
+		for item_id in item_ids:
+			authors.update(bibitems[item_id].authors)
+		return authors
+
+	def save(self, filename):
+		"""Save the index to the given file."""
+		with open(filename, "wb") as f:
+			pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
+
+	@staticmethod
+	def load(filename):
+		"""Load index from the given file."""
+		with open(filename, "rb") as f:
+			return pickle.load(f)
+
+
+# testing
+if __name__ == "__main__":
+	import bib_cache
+	items = bib_cache.parse_bib_cached("literature.bib")
+	index = TopicIndex(items)
+	print(index.get_authors(index.search('"petri net" OR agents', years=(2010, None)), items))
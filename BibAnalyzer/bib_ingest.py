@@ -0,0 +1,154 @@
+# -*- coding: utf8 -*-
+
+"""Ingestion module for Bibliography Analyzer Utility.
+by Tobias Küster, 2015
+
+- parse many BibTeX files at once, given as file names or glob patterns
+- split large files into shards on entry boundaries
+- parse the shards in a process pool and merge the results, removing duplicates,
+  and the reports of entries that could not be parsed
+
+Usage: bib_ingest.py [Options] File|Pattern [File|Pattern...]
+"""
+
+import glob
+import io
+import mmap
+import os
+import re
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import bib_parser
+
+# approximate size of the shards large files are split into, in bytes
+SHARD_SIZE = 1 << 24
+
+# start of an entry, and of a @string definition, at the beginning of a line
+ENTRY_LINE = re.compile(rb"\n[ \t]*@")
+STRING_LINE = re.compile(rb"(?im)^[ \t]*@string\s*[{(]")
+
+
+def expand_files(patterns):
+	"""Expand the given file names and glob patterns to a list of files, in
+	the order of the patterns and sorted within each pattern, without repeats.
+	Raises FileNotFoundError listing all patterns not matching any file.
+	"""
+	files, unmatched = [], []
+	for pattern in patterns:
+		matches = sorted(glob.glob(pattern))
+		if not matches:
+			unmatched.append(pattern)
+		for filename in matches:
+			if filename not in files:
+				files.append(filename)
+	if unmatched:
+		raise FileNotFoundError("No files matching: %s" % ", ".join(unmatched))
+	return files
+
+def split_file(filename, shard_size=SHARD_SIZE):
+	"""Split file into shards of about the given size, with each shard
+	starting with an entry at the beginning of a line. An "@" at the start of
+	a line within an entry, e.g. in an abstract, is not a boundary; this is
+	checked by counting the braces since the start of the shard. Returns a
+	list of (start, end) byte offsets.
+	"""
+	size = os.path.getsize(filename)
+	if not size:
+		return []
+	bounds = [0]
+	with open(filename, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+		while bounds[-1] + shard_size < size:
+			pos, depth = bounds[-1], 0
+			for match in ENTRY_LINE.finditer(data, bounds[-1] + shard_size):
+				text = data[pos:match.start()]
+				pos, depth = match.start(), depth + text.count(b"{") - text.count(b"}")
+				if depth <= 0:
+					bounds.append(match.start() + 1)
+					break
+			else:
+				break
+	bounds.append(size)
+	return list(zip(bounds, bounds[1:]))
+
+def read_macros(filename):
+	"""Collect all @string macros defined in the file, without parsing the
+	other entries, so they can be passed to the workers parsing the shards.
+	"""
+	macros = dict(bib_parser.MONTH_MACROS)
+	if not os.path.getsize(filename):
+		return macros
+	with open(filename, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+		for match in STRING_LINE.finditer(data):
+			end = ENTRY_LINE.search(data, match.end())
+			text = data[match.start():end.start() if end else len(data)].decode("utf8")
+			for _ in bib_parser.parse_bibtex_stream(io.StringIO(text), macros):
+				pass
+	return macros
+
+def parse_shard(filename, start, end, macros):
+	"""Parse the bibliography items in the given byte range of the file;
+	returns the list of items and the ParseErrors report.
+	"""
+	with open(filename, "rb") as f:
+		f.seek(start)
+		text = f.read(end - start).decode("utf8")
+	errors = bib_parser.ParseErrors()
+	items = list(bib_parser.parse_bibtex_stream(io.StringIO(text), dict(macros), errors=errors))
+	return items, errors
+
+def parse_bib_files(patterns, workers=None, shard_size=SHARD_SIZE, errors=None):
+	"""Parse bibliography items from many BibTeX files in parallel.
+	- patterns is a list of file names and/or glob patterns, each of which
+	  has to match at least one file, otherwise FileNotFoundError is raised
+	- workers is the number of worker processes; default: number of CPUs
+	- shard_size is the approximate size in bytes of the shards to parse
+	- errors is a ParseErrors report the reports of all shards are merged into
+	- yields the BibItems in order of files and entries, without duplicates
+	"""
+	shards = [(filename, start, end, macros)
+	          for filename in expand_files(patterns)
+	          for macros in [read_macros(filename)]
+	          for start, end in split_file(filename, shard_size)]
+	seen = set()
+	with ProcessPoolExecutor(workers) as pool:
+		for items, shard_errors in pool.map(parse_shard, *zip(*shards)) if shards else []:
+			if errors is not None:
+				errors.merge(shard_errors)
+			for item in items:
+				if item not in seen:
+					seen.add(item)
+					yield item
+
+
+def main():
+	"""Parse command line options and parse the given files.
+	"""
+	import optparse
+
+	parser = optparse.OptionParser("bib_ingest.py [Options] File|Pattern [File|Pattern...]")
+	parser.add_option("-j", "--jobs", dest="jobs", type="int",
+	                  help="number of worker processes; default: number of CPUs")
+	parser.add_option("-s", "--shard-size", dest="shard_size", type="float",
+	                  help="size of the shards large files are split into, in MB",
+	                  default=SHARD_SIZE / 2.**20)
+	parser.add_option("-c", "--count", dest="count", action="store_true",
+	                  help="only print the number of distinct items", default=False)
+	(options, args) = parser.parse_args()
+	if not args:
+		parser.error("no files given")
+
+	errors = bib_parser.ParseErrors()
+	items = parse_bib_files(args, options.jobs, int(options.shard_size * 2**20), errors)
+	try:
+		if options.count:
+			print(sum(1 for _ in items))
+		else:
+			for item in items:
+				print(item)
+	except FileNotFoundError as e:
+		parser.error(str(e))
+	if errors:
+		print(errors, file=sys.stderr)
+
+if __name__ == "__main__":
+	main()
@@ -4,34 +4,210 @@
 by Tobias Küster, 2015
 
 - simple representation for bibliography item
+- columnar corpus of many bibliography items, with lightweight item views
 """
 
+from array import array
+
+
+def parse_year(year):
+	"""Get year as int, if it is a number, otherwise return it unchanged."""
+	if isinstance(year, str) and year.strip().isdigit():
+		return int(year)
+	return year
+
+def packed_year(year):
+	"""Get year as stored in an array("H") column, i.e. 0 if it is unknown,
+	not a number or out of range.
+	"""
+	return year if isinstance(year, int) and 0 < year <= 0xFFFF else 0
+
+def item_hash(authors, title, year):
+	"""Get hash of bibliography item with the given attributes."""
+	res = 17 + hash(authors)
+	res *= 23 + hash(title)
+	res *= 31 + hash(year)
+	return hash(res)
+
+
 class BibItem:
 	"""Class representing a bibliography item.
-	
+
 	This is intentionally held simple, with just the very basic attributes, such
-	as title of the publication, a list of authors, and the year.
+	as title of the publication, a list of authors, and the year. Items should
+	not be modified after creation, as their hash is cached.
 	"""
-	
+
+	__slots__ = ("authors", "title", "year", "_hash")
+
 	def __init__(self, authors, title, year):
 		self.authors = tuple(authors)
 		self.title = title
-		self.year = year
-		
+		self.year = parse_year(year)
+		self._hash = None
+
 	def __hash__(self):
-		res = 17 + hash(self.authors)
-		res *= 23 + hash(self.title)
-		res *= 31 + hash(self.year)
-		return res
-		
+		if self._hash is None:
+			self._hash = item_hash(self.authors, self.title, self.year)
+		return self._hash
+
 	def __eq__(self, other):
-		return (isinstance(other, BibItem) and
-				self.authors == other.authors and
+		if not isinstance(other, BibItem):
+			return NotImplemented
+		return (self.authors == other.authors and
 				self.title == other.title and
 				self.year == other.year)
-		
+
 	def __str__(self):
 		return "{0}: {1}; {2}".format(", ".join(self.authors), self.title, self.year)
-		
+
 	def __repr__(self):
 		return "BibItem(authors=%r, title=%r, year=%r)" % (self.authors, self.title, self.year)
+
+
+class BibItemView:
+	"""Lightweight view of a single item in a BibCorpus.
+
+	Views have the same attributes as BibItems and compare equal to BibItems
+	(and other views) with the same authors, title and year, but they hold
+	only a reference to the corpus and the item's index.
+	"""
+
+	__slots__ = ("corpus", "index")
+
+	def __init__(self, corpus, index):
+		self.corpus = corpus
+		self.index = index
+
+	authors = property(lambda self: self.corpus.get_authors(self.index))
+	title = property(lambda self: self.corpus.get_title(self.index))
+	year = property(lambda self: self.corpus.get_year(self.index))
+
+	def __hash__(self):
+		return self.corpus.get_hash(self.index)
+
+	def __eq__(self, other):
+		if not isinstance(other, (BibItem, BibItemView)):
+			return NotImplemented
+		return (self.authors == other.authors and
+				self.title == other.title and
+				self.year == other.year)
+
+	def __str__(self):
+		return "{0}: {1}; {2}".format(", ".join(self.authors), self.title, self.year)
+
+	def __repr__(self):
+		return "BibItemView(authors=%r, title=%r, year=%r)" % (self.authors, self.title, self.year)
+
+
+class BibCorpus:
+	"""Columnar container for a large number of bibliography items.
+
+	Author names are interned to integer IDs, and the author IDs, titles
+	(UTF-8 encoded), years and hashes of all items are held in flat arrays,
+	so a corpus needs only a fraction of the memory of as many BibItems.
+	Indexing and iterating the corpus yields BibItemViews; unknown years are
+	stored as 0 and returned as None, and years that are no numbers or out of
+	range (e.g. "in press") are stored as 0, too, and kept in a side table.
+
+	Hashes of strings differ from process to process, so the item hashes are
+	not pickled, but computed again when the corpus is unpickled.
+	"""
+
+	def __init__(self, items=()):
+		self.author_names = []                  # author ID -> name
+		self.author_ids = {}                    # name -> author ID
+		self.author_index = array("I")          # author IDs of all items
+		self.author_offsets = array("Q", [0])   # start of item's author IDs
+		self.title_data = bytearray()           # titles of all items
+		self.title_offsets = array("Q", [0])    # start of item's title
+		self.years = array("H")                 # packed years of all items
+		self.other_years = {}                   # index -> year not packable
+		self.hashes = array("q")
+		self.cache = {}                         # derived data, e.g. tokens
+		self.extend(items)
+
+	def __len__(self):
+		return len(self.years)
+
+	def __getitem__(self, index):
+		if index < 0:
+			index += len(self)
+		if not 0 <= index < len(self):
+			raise IndexError("corpus index out of range")
+		return BibItemView(self, index)
+
+	def __iter__(self):
+		return (BibItemView(self, i) for i in range(len(self)))
+
+	def __getstate__(self):
+		state = dict(self.__dict__)
+		del state["hashes"]
+		return state
+
+	def __setstate__(self, state):
+		self.__dict__.update(state)
+		self.hashes = array("q", (item_hash(self.get_authors(i), self.get_title(i), self.get_year(i))
+		                          for i in range(len(self))))
+
+	def intern(self, author):
+		"""Get ID for the given author name, adding it if it is new."""
+		author_id = self.author_ids.get(author)
+		if author_id is None:
+			author_id = self.author_ids[author] = len(self.author_names)
+			self.author_names.append(author)
+		return author_id
+
+	def append(self, item):
+		"""Add a bibliography item (or anything having the same attributes)
+		to the corpus and return its index.
+		"""
+		# get all attributes first, so a bad item does not leave the columns
+		# with different lengths
+		authors, title = tuple(item.authors), item.title
+		title_data, year = title.encode("utf8"), parse_year(item.year)
+		packed, index = packed_year(year), len(self)
+		if not packed and year is not None:
+			self.other_years[index] = year
+		self.author_index.extend(self.intern(author) for author in authors)
+		self.author_offsets.append(len(self.author_index))
+		self.title_data += title_data
+		self.title_offsets.append(len(self.title_data))
+		self.years.append(packed)
+		self.hashes.append(item_hash(authors, title, year))
+		return index
+
+	def extend(self, items):
+		"""Add all the given bibliography items to the corpus."""
+		for item in items:
+			self.append(item)
+
+	def get_author_ids(self, index):
+		"""Get array of author IDs of the item with the given index."""
+		return self.author_index[self.author_offsets[index]:self.author_offsets[index+1]]
+
+	def get_authors(self, index):
+		"""Get tuple of author names of the item with the given index."""
+		names = self.author_names
+		return tuple(names[i] for i in self.get_author_ids(index))
+
+	def get_title(self, index):
+		"""Get title of the item with the given index."""
+		start, end = self.title_offsets[index], self.title_offsets[index+1]
+		return self.title_data[start:end].decode("utf8")
+
+	def get_year(self, index):
+		"""Get year of the item with the given index, or None if unknown."""
+		return self.years[index] or self.other_years.get(index)
+
+	def get_hash(self, index):
+		"""Get cached hash of the item with the given index."""
+		return self.hashes[index]
+
+	def iter_authors(self):
+		"""Iterate the tuples of author names of all items."""
+		return (self.get_authors(i) for i in range(len(self)))
+
+	def iter_titles(self):
+		"""Iterate the titles of all items."""
+		return (self.get_title(i) for i in range(len(self)))
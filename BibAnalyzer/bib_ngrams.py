@@ -0,0 +1,84 @@
+# -*- coding: utf8 -*-
+
+"""N-gram counting for Bibliography Analyzer Utility.
+by Tobias Küster, 2015
+
+- count n-grams of all orders 1 up to n in a single pass over word ID arrays
+- approximate top-k counting in bounded memory, using Space-Saving
+"""
+
+import heapq
+from collections import Counter
+
+# number of counters kept per requested top-k n-gram in Space-Saving mode
+CAPACITY_FACTOR = 10
+
+
+def iter_ngrams(words, n):
+	"""Iterate all n-grams of orders 1 up to n in the sequence of words (or
+	word IDs), as tuples.
+	"""
+	words = tuple(words)
+	for k in range(1, n + 1):
+		for i in range(len(words) - k + 1):
+			yield words[i:i+k]
+
+
+class SpaceSaving:
+	"""Approximate counter for the most frequent keys in a stream.
+
+	Implements the Space-Saving algorithm by Metwally et al.: at most capacity
+	keys are counted; a new key replaces the key with the lowest count and
+	inherits that count, which is remembered as the new key's maximum error.
+	Every key more frequent than total/capacity is guaranteed to be counted.
+	"""
+
+	def __init__(self, capacity):
+		self.capacity = capacity
+		self.counts = {}
+		self.errors = {}
+		self.heap = []   # (count, key), with count possibly lower than actual
+
+	def update(self, keys):
+		"""Count each of the keys."""
+		counts = self.counts
+		for key in keys:
+			if key in counts:
+				counts[key] += 1
+			elif len(counts) < self.capacity:
+				counts[key] = 1
+				self.errors[key] = 0
+				heapq.heappush(self.heap, (1, key))
+			else:
+				count = self._pop_min()
+				counts[key] = count + 1
+				self.errors[key] = count
+				heapq.heappush(self.heap, (count + 1, key))
+
+	def _pop_min(self):
+		"""Remove key with the lowest count and return that count."""
+		while True:
+			count, key = heapq.heappop(self.heap)
+			if count == self.counts[key]:
+				del self.counts[key]
+				del self.errors[key]
+				return count
+			heapq.heappush(self.heap, (self.counts[key], key))
+
+	def most_common(self, k=None):
+		"""Get list of (key, estimated count) for the k most frequent keys."""
+		return Counter(self.counts).most_common(k)
+
+
+def count_ngrams(titles, n, top_k=None):
+	"""Count n-grams of all orders 1 up to n in one pass over the titles.
+	- titles is an iterable of sequences of words or word IDs
+	- n is the maximum order of n-grams to count
+	- top_k, if given, limits counting to approximately the top_k most frequent
+	  n-grams, using Space-Saving with bounded memory
+	- returns dict mapping n-gram tuples to their (estimated) counts
+	"""
+	counter = Counter() if top_k is None else SpaceSaving(top_k * CAPACITY_FACTOR)
+	for words in titles:
+		counter.update(iter_ngrams(words, n))
+	return counter if top_k is None else dict(counter.most_common(top_k))
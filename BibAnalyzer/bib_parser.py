@@ -4,12 +4,170 @@
 by Tobias Küster, 2015
 
 - parse bib items from simple lists
-- parse bib items from bibtex files
+- parse bib items from bibtex files, streaming with a brace-aware tokenizer
+- parse bib items from RIS and CSL-JSON files
+- registry of formats with precompiled patterns, and structured error reports
 """
 
 import re
+import json
+from collections import Counter
 from bib_model import BibItem
 
+# number of characters read at once by the streaming BibTeX parser
+CHUNK_SIZE = 1 << 16
+
+# delimiters relevant for finding the end of an entry or a field value
+BRACES = re.compile(r"[{}]")
+PARENS = re.compile(r"[{})]")
+QUOTE_BRACES = re.compile(r'[{}"]')
+
+# field name and equals sign, unquoted field value, and separator after value
+FIELD_NAME = re.compile(r"\s*([^\s=,{}\"#]+)\s*=\s*")
+FIELD_WORD = re.compile(r"[^\s,#{}\"]+")
+FIELD_SEPARATOR = re.compile(r"\s*(#|,|)\s*")
+
+
+def nested_braces(levels):
+	"""Get pattern for text with balanced braces nested up to the given
+	depth, as an "unrolled loop", which matches (or fails) in linear time.
+	"""
+	pattern = r"[^{}]*"
+	for _ in range(levels):
+		pattern = r"[^{}]*(?:\{%s\}[^{}]*)*" % pattern
+	return pattern
+
+# contents of an entry or a field value, for the common case of little nesting
+NESTED = nested_braces(4)
+
+# start of a BibTeX entry, e.g. "@article{" (or "@article("), and its body
+# if the entry is complete and has little nesting
+ENTRY_START = re.compile(r"@\s*(\w+)\s*(?:\{(%s)\}|([{(]))" % NESTED)
+
+# field value in braces or quotes, or macro or number; with and without groups
+VALUE_GROUPS = r'(?:\{(%s)\}|"([^{}"]*)"|([^\s,#{}"]+))' % NESTED
+VALUE = r'(?:\{%s\}|"[^{}"]*"|[^\s,#{}"]+)' % NESTED
+
+# complete field, with further values concatenated with "#" and the separator
+# after it; groups are the entire field, name, first value, and other values
+SIMPLE_FIELD = re.compile(r'(\s*([^\s=,{}"#]+)\s*=\s*%s((?:\s*\#\s*%s)*)\s*(?:,\s*|\Z))'
+                          % (VALUE_GROUPS, VALUE))
+VALUE_PART = re.compile(r"\s*#\s*" + VALUE_GROUPS)
+
+# predefined BibTeX month macros, used unless overridden by @string entries
+MONTH_MACROS = {"jan": "January", "feb": "February", "mar": "March",
+                "apr": "April", "may": "May", "jun": "June",
+                "jul": "July", "aug": "August", "sep": "September",
+                "oct": "October", "nov": "November", "dec": "December"}
+
+
+class ParseErrors:
+	"""Report of the entries that could not be parsed.
+
+	Instead of printing a warning for each bad entry, the parsers add them to
+	a report, which counts the errors by message and keeps the first few
+	entries as samples, so even very dirty inputs do not slow down parsing.
+	"""
+
+	def __init__(self, max_samples=10):
+		self.count = 0
+		self.messages = Counter()   # error message -> number of entries
+		self.samples = []           # (entry, error message)
+		self.max_samples = max_samples
+
+	def __len__(self):
+		return self.count
+
+	def add(self, entry, error):
+		"""Add entry (a string) that could not be parsed, and the error."""
+		self.count += 1
+		self.messages[str(error)] += 1
+		if len(self.samples) < self.max_samples:
+			self.samples.append((entry[:200], str(error)))
+
+	def merge(self, other):
+		"""Add the errors of another report, e.g. of a parallel worker."""
+		self.count += other.count
+		self.messages.update(other.messages)
+		self.samples.extend(other.samples[:self.max_samples - len(self.samples)])
+
+	def __str__(self):
+		lines = ["%d entries could not be parsed" % self.count]
+		lines.extend("%6d x %s" % (num, msg) for msg, num in self.messages.most_common())
+		lines.extend("Sample (%s):\n%s" % (msg, entry) for entry, msg in self.samples)
+		return "\n".join(lines)
+
+
+class BibFormat:
+	"""Specification of a bibliography file format.
+
+	A format has a name, the usual file extensions, and a function parsing a
+	file object to BibItems, adding errors to a ParseErrors report. Formats
+	are registered in FORMATS using register_format.
+	"""
+
+	def __init__(self, name, extensions, parse_stream):
+		self.name = name
+		self.extensions = extensions
+		self.parse_stream = parse_stream
+
+	def parse(self, filename, errors=None):
+		"""Lazily parse bibliography items from the file with the given name.
+		"""
+		if errors is None:
+			errors = ParseErrors()
+		with open(filename, encoding="utf8") as f:
+			yield from self.parse_stream(f, errors)
+
+
+class RegexFormat(BibFormat):
+	"""Format whose entries are matched by a regular expression, and whose
+	authors, title and year are then extracted with a single match of a
+	second pattern with these named groups (the year being optional). If no
+	fields pattern is given, the groups are taken from the entry match.
+	"""
+
+	def __init__(self, name, extensions, entry_pattern, fields_pattern=None, author_sep=","):
+		BibFormat.__init__(self, name, extensions, self.parse_text)
+		self.entry_pattern = re.compile(entry_pattern)
+		self.fields_pattern = fields_pattern and re.compile(fields_pattern)
+		self.author_sep = author_sep
+
+	def parse_text(self, f, errors):
+		"""Parse bibliography items from the whole content of the file."""
+		for entry in self.entry_pattern.finditer(f.read()):
+			fields = self.fields_pattern.match(entry.group()) if self.fields_pattern else entry
+			if fields is None:
+				errors.add(entry.group(), "Missing author or title")
+				continue
+			groups = fields.groupdict()
+			authors = [author.strip() for author in groups["authors"].split(self.author_sep)]
+			yield BibItem(authors, groups["title"], groups.get("year"))
+
+
+# registered bibliography formats, by name
+FORMATS = {}
+
+def register_format(bib_format):
+	"""Register the format, so files can be parsed with parse_file."""
+	FORMATS[bib_format.name] = bib_format
+	return bib_format
+
+def get_format(filename):
+	"""Get registered format for the file name's extension."""
+	extension = filename.rsplit(".", 1)[-1].lower()
+	for bib_format in FORMATS.values():
+		if extension in bib_format.extensions:
+			return bib_format
+	raise ValueError("Unknown bibliography format: %s" % filename)
+
+def parse_file(filename, format_name=None, errors=None):
+	"""Parse bibliography items from file in the named format, or in the
+	format registered for its extension; errors are added to the report.
+	"""
+	bib_format = FORMATS[format_name] if format_name else get_format(filename)
+	return bib_format.parse(filename, errors)
+
 
 def parse_bib(filename, entry_regex, parse_func):
 	"""Read file and parse bibliography items.
@@ -22,14 +180,20 @@ def parse_bib(filename, entry_regex, parse_func):
 		return filter(None, (parse_func(item.group()) 
 		                     for item in re.finditer(entry_regex, f.read())))
 
-def make_parse_func(authors_regex, title_regex, year_regex, author_sep=","):
+def make_parse_func(authors_regex, title_regex, year_regex, author_sep=",", errors=None):
 	"""Create and return a function creating BibItems using regular expressions
-	for title, author and year.
+	for title, author and year. Items that can not be parsed are added to the
+	errors report; see RegexFormat for matching all of them at once.
 	"""
+	compile_ = lambda regex: re.compile(regex) if regex else None
+	authors_regex, title_regex, year_regex = map(compile_, (authors_regex, title_regex, year_regex))
+	if errors is None:
+		errors = ParseErrors()
+
 	def func(item):
 		"""function parsing item (a string) to BibItem object.
 		"""
-		extract = lambda regex: re.search(regex, item).group(1) if regex else None
+		extract = lambda regex: regex.search(item).group(1) if regex else None
 		try:
 			authors = extract(authors_regex)
 			title = extract(title_regex)
@@ -37,49 +201,272 @@ def make_parse_func(authors_regex, title_regex, year_regex, author_sep=","):
 			author_list = [author.strip() for author in authors.split(author_sep)]
 			return BibItem(author_list, title, year)
 		except Exception as e:
-			print("WARNING: Could not parse item: \n" + item)
-			print("Error was: ", e)
+			errors.add(item, e)
 			
 	return func
 
-def parse_bib_from_list(filename):
+def parse_bib_from_list(filename, errors=None):
 	"""Parse list of bibliography items from simple text file, assuming format
 	TITEL: <the title>
 	AUTOR: <list of authors>
 	"""
-	entry_regex   = r"TITEL: .*\s*AUTOR: .*"
-	parse_func = make_parse_func(r"AUTOR: (.*)", r"TITEL: (.*)", None)
-	return parse_bib(filename, entry_regex, parse_func)
+	return FORMATS["list"].parse(filename, errors)
 
-def parse_bib_from_bibtex(filename):
+def parse_bib_from_bibtex_regex(filename, errors=None):
 	"""Parse list of bibliography items from Bibtex file. Bibtex is not a 
 	regular language, but assuming that each entry starts and ends at the 
 	beginning of a line, we can still get some good results with a regex.
+	This reads the entire file at once; mostly kept for comparison with the
+	streaming parser, see parse_bib_from_bibtex.
+	"""
+	return FORMATS["bibtex-regex"].parse(filename, errors)
+
+
+def read_bibtex_entries(f, chunk_size=CHUNK_SIZE, errors=None):
+	"""Read raw entries from a BibTeX file object, chunk by chunk.
+	- f is a file-like object opened in text mode
+	- chunk_size is the number of characters read at once
+	- errors is an optional ParseErrors report for an unbalanced last entry
+	- yields tuples (entry type, entry body), with the type in lower case and
+	  the body being everything between the entry's outer braces
+	Only braces are counted, so entries may span any number of lines (and
+	chunks); anything between entries is treated as a comment, as in BibTeX.
+	"""
+	buf, pos = "", 0
+	while True:
+		header = ENTRY_START.search(buf, pos)
+		if header is None:
+			chunk = f.read(chunk_size)
+			if not chunk:
+				return
+			# keep what might be the beginning of a split-up entry header
+			tail = buf.rfind("@", pos)
+			buf, pos = (buf[tail:] if tail >= 0 else "") + chunk, 0
+			continue
+
+		kind, body, opening = header.groups()
+		kind = kind.lower()
+		# fast path for complete entries with little nesting, else count braces
+		if body is not None:
+			yield kind, body
+			pos = header.end()
+			continue
+		delimiters = BRACES if opening == "{" else PARENS
+		start = scan = header.end()
+		depth, end = 0, None
+		while end is None:
+			for match in delimiters.finditer(buf, scan):
+				char = match.group()
+				if char == "{":
+					depth += 1
+				elif depth and char == "}":
+					depth -= 1
+				elif not depth:
+					end = match.start()
+					break
+			else:
+				chunk = f.read(chunk_size)
+				if not chunk:
+					if errors is not None:
+						errors.add(buf[start:], "Unbalanced braces in last entry")
+					return
+				buf, start, scan = buf[start:] + chunk, 0, len(buf) - start
+		yield kind, buf[start:end]
+		pos = end + 1
+
+def parse_bibtex_fields(body, macros, key=True):
+	"""Parse the fields of a BibTeX entry body to a dictionary.
+	- body is the entry body, as yielded by read_bibtex_entries
+	- macros is a dictionary of @string macros (lower-case names) to resolve
+	- key specifies whether the body starts with a citation key to be skipped
+	- returns dict mapping lower-case field names to their values
+	Field values can be nested in braces or quotes, reference macros, and be
+	concatenated using "#". Outer delimiters are removed from the values and
+	whitespace is normalized, but inner braces are kept as they are.
+	"""
+	fields = {}
+	pos = body.find(",") + 1 if key else 0
+	if key and not pos:
+		return fields
+	# fast path for the common case of little nesting: match all fields at
+	# once, and use them if they are adjacent and cover the rest of the body
+	covered = pos
+	for whole, name, braced, quoted, word, more in SIMPLE_FIELD.findall(body, pos):
+		covered += len(whole)
+		if word:
+			braced = word if word.isdigit() else macros.get(word.lower(), word)
+		fields[name.lower()] = " ".join(concatenate(braced or quoted, more, macros).split()
+		                                if more else (braced or quoted).split())
+	if covered == len(body):
+		return fields
+	fields = {}
+	while True:
+		simple = SIMPLE_FIELD.match(body, pos)
+		if simple:
+			_, name, braced, quoted, word, more = simple.groups()
+			if word:
+				braced = word if word.isdigit() else macros.get(word.lower(), word)
+			fields[name.lower()] = " ".join(concatenate(braced or quoted or "", more, macros).split())
+			pos = simple.end()
+			continue
+
+		name = FIELD_NAME.match(body, pos)
+		if name is None:
+			break
+		parts, pos = [], name.end()
+		while True:
+			char = body[pos:pos+1]
+			if char == "{":
+				end = find_closing(body, pos + 1, BRACES)
+				parts.append(body[pos+1:end])
+			elif char == '"':
+				end = find_closing(body, pos + 1, QUOTE_BRACES)
+				parts.append(body[pos+1:end])
+			else:
+				word = FIELD_WORD.match(body, pos)
+				if word is None:
+					raise ValueError("Missing value for field " + name.group(1))
+				end = word.end() - 1
+				word = word.group()
+				parts.append(word if word.isdigit() else macros.get(word.lower(), word))
+			separator = FIELD_SEPARATOR.match(body, end + 1)
+			pos = separator.end()
+			if separator.group(1) != "#":
+				break
+		fields[name.group(1).lower()] = " ".join("".join(parts).split())
+		if not separator.group(1):
+			break
+	return fields
+
+def concatenate(value, more, macros):
+	"""Append the values concatenated with "#" to the first value of a field
+	matched by SIMPLE_FIELD, resolving macros.
+	"""
+	for braced, quoted, word in VALUE_PART.findall(more or ""):
+		value += (word if word.isdigit() else macros.get(word.lower(), word)) if word else braced or quoted
+	return value
+
+def find_closing(string, pos, delimiters):
+	"""Find position of the closing brace or quote matching an opening one
+	just before pos, skipping over any nested braces.
 	"""
-	entry_regex = r'''
-			(?msx)    # flags: multi-line, dot-match-all, verbose
-			^@\w+\{   # start of line, item type
-			.*?       # content, can span multiple lines, non-greedy
-			^\}       # start of line, closing parens
-			'''
-	attr_regex = r'''
-			(?ix)     # flags: ignore-case, verbose
-			\s*       # leading space
-			%s        # what to match: author, title, or year
-			\s*=\s*   # space and equals
-			[{\"']    # opening parens
-			(.*)      # the actual author, title, or year
-			[}\"']    # closing parens or quote
-			\,?       # optional comma
-			'''
-	parse_func = make_parse_func(attr_regex % "author", attr_regex % "title", 
-	                             attr_regex % "year", " and ")
-	return parse_bib(filename, entry_regex, parse_func)
+	depth = 0
+	for match in delimiters.finditer(string, pos):
+		char = match.group()
+		if char == "{":
+			depth += 1
+		elif depth and char == "}":
+			depth -= 1
+		elif not depth:
+			return match.start()
+	raise ValueError("Unbalanced braces or quotes")
+
+def parse_bibtex_stream(f, macros=None, chunk_size=CHUNK_SIZE, errors=None):
+	"""Lazily parse bibliography items from a BibTeX file object.
+	- f is a file-like object opened in text mode
+	- macros is a dictionary of known @string macros; it is updated in place
+	  with the definitions found in the file; default: the month macros
+	- chunk_size is the number of characters read at once
+	- errors is a ParseErrors report for entries that could not be parsed
+	- yields BibItems for all entries having an author and a title
+	"""
+	if macros is None:
+		macros = dict(MONTH_MACROS)
+	if errors is None:
+		errors = ParseErrors()
+	for kind, body in read_bibtex_entries(f, chunk_size, errors):
+		if kind in ("comment", "preamble"):
+			continue
+		try:
+			if kind == "string":
+				macros.update(parse_bibtex_fields(body, macros, key=False))
+				continue
+			fields = parse_bibtex_fields(body, macros)
+			if "author" not in fields or "title" not in fields:
+				raise ValueError("Missing author or title")
+			authors = fields["author"].split(" and ")
+			yield BibItem(authors, fields["title"], fields.get("year"))
+		except Exception as e:
+			errors.add("@%s{%s}" % (kind, body), e)
+
+def parse_bib_from_bibtex(filename, chunk_size=CHUNK_SIZE, errors=None):
+	"""Parse list of bibliography items from Bibtex file. In contrast to the
+	regular expression used in parse_bib_from_bibtex_regex, the file is read
+	in chunks and scanned for matching braces, so nested braces, @string
+	macros and "#" concatenation are handled properly and the items are
+	yielded one after the other without reading the whole file into memory.
+	"""
+	with open(filename, encoding="utf8") as f:
+		yield from parse_bibtex_stream(f, chunk_size=chunk_size, errors=errors)
+
+
+def parse_ris_stream(f, errors):
+	"""Lazily parse bibliography items from a RIS file object, taking the
+	authors from AU/A1 tags, the title from TI/T1 and the year from PY/Y1.
+	"""
+	fields, lines = {}, []
+	for line in f:
+		tag = RIS_TAG.match(line)
+		if tag is None:
+			continue
+		lines.append(line)
+		name, value = tag.groups()
+		if name != "ER":
+			fields.setdefault(name, []).append(value.strip())
+			continue
+		authors = fields.get("AU", []) + fields.get("A1", [])
+		title = (fields.get("TI") or fields.get("T1") or [None])[0]
+		year = RIS_YEAR.match((fields.get("PY") or fields.get("Y1") or [""])[0])
+		if authors and title:
+			yield BibItem(authors, title, year and year.group())
+		else:
+			errors.add("".join(lines), "Missing author or title")
+		fields, lines = {}, []
+
+def parse_csl_json_stream(f, errors):
+	"""Parse bibliography items from a CSL-JSON file object, i.e. a list of
+	objects with "author" (list of names with "given" and "family" or
+	"literal" name), "title" and "issued" ("date-parts") attributes.
+	"""
+	for entry in json.load(f):
+		try:
+			authors = [name.get("literal") or ("%s %s" % (name.get("given", ""), name["family"])).strip()
+			           for name in entry["author"]]
+			issued = entry.get("issued", {}).get("date-parts", [[None]])
+			yield BibItem(authors, entry["title"], issued[0][0] if issued[0] else None)
+		except Exception as e:
+			errors.add(json.dumps(entry), e)
+
+
+# tag line in a RIS file, and year at the start of a date
+RIS_TAG = re.compile(r"([A-Z][A-Z0-9])  -\s?(.*)")
+RIS_YEAR = re.compile(r"\d{4}")
+
+register_format(RegexFormat("list", ("txt",),
+		r"TITEL: (?P<title>.*)\s*AUTOR: (?P<authors>.*)"))
+register_format(RegexFormat("bibtex-regex", (),
+		r'''(?msx)    # flags: multi-line, dot-match-all, verbose
+		^@\w+\{   # start of line, item type
+		.*?       # content, can span multiple lines, non-greedy
+		^\}       # start of line, closing parens
+		''',
+		r'''(?imx)    # flags: ignore-case, multi-line, verbose
+		# look ahead for each field, in any order, within the same entry;
+		# value is everything in the line up to the last closing parens
+		(?=[\s\S]*?\s author \s*=\s* [{"'] (?P<authors>.*) [}"'] )
+		(?=[\s\S]*?\s title  \s*=\s* [{"'] (?P<title>.*)   [}"'] )
+		(?=(?:[\s\S]*?\s year \s*=\s* [{"'] (?P<year>.*)  [}"'] )?)
+		''', " and "))
+register_format(BibFormat("bibtex", ("bib",), lambda f, errors: parse_bibtex_stream(f, errors=errors)))
+register_format(BibFormat("ris", ("ris",), parse_ris_stream))
+register_format(BibFormat("csl-json", ("json",), parse_csl_json_stream))
 
 
 # just for testing...
 if __name__ == "__main__":
 	# items = parse_bib_from_list("AAMAS 2013.txt")
-	items = parse_bib_from_bibtex("literature.bib")
+	errors = ParseErrors()
+	items = parse_file("literature.bib", errors=errors)
 	for item in items:
 		print(item)
+	print(errors)
@@ -0,0 +1,113 @@
+# -*- coding: utf8 -*-
+
+"""Tokenization module for Bibliography Analyzer Utility.
+by Tobias Küster, 2015
+
+- split titles into words, drop uninteresting words, and stem them
+- stem each distinct word only once, using a bounded cache
+- map words to integer IDs and keep the word IDs of each title in an array
+"""
+
+import re
+from array import array
+from functools import lru_cache
+import stemmer # http://tartarus.org/~martin/PorterStemmer/
+from bib_model import BibCorpus
+
+# some words that are not interesting for common title words, n-grams, etc.
+BAD_WORDS = set(['a', 'about', 'an', 'and', 'are', 'as', 'at', 'be', 'between',
+                 'by', 'can', 'do', 'for', 'from', 'here', 'how', 'in', 'into',
+                 'is', 'new', 'no', 'of', 'on', 'or', 'over', 'the', 'to',
+                 'towards', 'under', 'using', 'via', 'what', 'when', 'who',
+                 'why', 'with']
+)
+
+# regular expression for finding words in titles
+#TODO improve this regex
+WORDS_PATTERN = re.compile(r"[a-z0-9-_]*[a-z][a-z0-9-_]*")
+
+# the stemmer used for normalizing the words
+STEMMER = stemmer.PorterStemmer()
+
+# maximum number of distinct words whose stems are cached
+STEM_CACHE_SIZE = 1 << 16
+
+# cached version of the stemmer's stemWord method
+stem_word = lru_cache(maxsize=STEM_CACHE_SIZE)(STEMMER.stemWord)
+
+
+def normalize_word(word, stemming=False):
+	"""Get the (optionally stemmed) word, or None if it is a bad word."""
+	if stemming:
+		word = stem_word(word)
+	return None if word in BAD_WORDS else word
+
+
+class TitleTokens:
+	"""Titles of a sequence of bibliography items as arrays of word IDs.
+
+	Each title is split into words, and each distinct word is normalized only
+	once, after which it is mapped to its ID using a dictionary. The resulting
+	word ID arrays can be used for counting n-grams, looking up topics, etc.
+	without ever touching the title strings again.
+	"""
+
+	def __init__(self, titles=(), stemming=False):
+		"""Create tokens for the given titles, optionally using stemming."""
+		self.stemming = stemming
+		self.words = []     # word ID -> normalized word
+		self.ids = {}       # normalized word -> word ID
+		self.raw = {}       # word as found in title -> word ID, or None
+		self.titles = []    # item -> array of word IDs
+		self.extend(titles)
+
+	def __len__(self):
+		return len(self.titles)
+
+	def __getitem__(self, index):
+		return self.titles[index]
+
+	def word_id(self, word, add=False):
+		"""Get ID of the given word after normalizing it; None if it is a bad
+		word, or if it is not known yet and add is false.
+		"""
+		if word not in self.raw:
+			normalized = normalize_word(word, self.stemming)
+			if normalized is not None and normalized not in self.ids:
+				if not add:
+					return None
+				self.ids[normalized] = len(self.words)
+				self.words.append(normalized)
+			self.raw[word] = self.ids.get(normalized)
+		return self.raw[word]
+
+	def tokenize(self, title, add=False):
+		"""Get array of IDs of the (non-bad) words in the title. Unknown words
+		are added if add is true, otherwise they are skipped.
+		"""
+		raw, word_ids = self.raw, array("I")
+		for word in WORDS_PATTERN.findall(title.lower()):
+			word_id = raw[word] if word in raw else self.word_id(word, add)
+			if word_id is not None:
+				word_ids.append(word_id)
+		return word_ids
+
+	def extend(self, titles):
+		"""Tokenize and append the given titles."""
+		self.titles.extend(self.tokenize(title, add=True) for title in titles)
+
+
+def get_title_tokens(bibitems, stemming=False):
+	"""Get TitleTokens for the titles of the bibliography items. For a
+	BibCorpus, the tokens are kept in its cache and just extended by the
+	items added in the meantime.
+	"""
+	if not isinstance(bibitems, BibCorpus):
+		return TitleTokens((item.title for item in bibitems), stemming)
+	key = ("title tokens", stemming)
+	tokens = bibitems.cache.get(key)
+	if tokens is None:
+		tokens = bibitems.cache[key] = TitleTokens(stemming=stemming)
+	if len(tokens) < len(bibitems):
+		tokens.extend(bibitems.get_title(i) for i in range(len(tokens), len(bibitems)))
+	return tokens
@@ -0,0 +1,168 @@
+# -*- coding: utf8 -*-
+
+"""Trend analysis for Bibliography Analyzer Utility.
+by Tobias Küster, 2015
+
+- count title n-grams and authors per year, in one pass, as dense matrices
+- find rising and declining topics, and bursts of topics or authors
+- get the topic profile of an author
+"""
+
+from collections import Counter
+from array import array
+import numpy as np
+from bib_model import BibCorpus
+from bib_tokens import get_title_tokens
+from bib_ngrams import iter_ngrams
+
+
+class TrendMatrix:
+	"""Counts of keys (title n-grams or authors) per year.
+
+	The counts are held in a NumPy array with one row per key and one column
+	per year, from first_year up to the last year found in the items.
+	"""
+
+	def __init__(self, keys, first_year, counts):
+		self.keys = keys
+		self.index = {key: row for row, key in enumerate(keys)}
+		self.first_year = first_year
+		self.counts = counts
+
+	@property
+	def years(self):
+		"""Get array of the years corresponding to the columns."""
+		return np.arange(self.first_year, self.first_year + self.counts.shape[1])
+
+	def series(self, key):
+		"""Get array of counts per year for the given key."""
+		return self.counts[self.index[key]]
+
+	def window(self, size):
+		"""Get new TrendMatrix with the counts summed over a sliding window of
+		the given number of years, ending in the respective column's year.
+		"""
+		cumulative = np.cumsum(self.counts, axis=1)
+		shifted = np.zeros_like(cumulative)
+		shifted[:, size:] = cumulative[:, :-size]
+		return TrendMatrix(self.keys, self.first_year, cumulative - shifted)
+
+	def slopes(self, span=5, last_year=None, relative=True):
+		"""Get array of least-squares slopes of each key's counts over the
+		span years up to last_year (default: last year). If relative, the
+		counts are first divided by the total count of all keys in that year,
+		so the growth of the whole corpus is factored out.
+		"""
+		end = self.counts.shape[1] if last_year is None else last_year - self.first_year + 1
+		values = self.counts[:, max(end - span, 0):end].astype(float)
+		if relative:
+			values /= np.maximum(values.sum(axis=0), 1)
+		x = np.arange(values.shape[1]) - (values.shape[1] - 1) / 2.
+		return values @ x / max((x ** 2).sum(), 1)
+
+	def rising(self, number=10, **kwargs):
+		"""Get list of (key, slope) for the keys rising the most; keyword
+		arguments are passed to slopes.
+		"""
+		slopes = self.slopes(**kwargs)
+		return [(self.keys[row], float(slopes[row])) for row in np.argsort(-slopes)[:number]]
+
+	def declining(self, number=10, **kwargs):
+		"""Get list of (key, slope) for the keys declining the most."""
+		slopes = self.slopes(**kwargs)
+		return [(self.keys[row], float(slopes[row])) for row in np.argsort(slopes)[:number]]
+
+	def bursts(self, threshold=3., history=3, min_count=5):
+		"""Get list of (key, year, score) for years in which a key's count is
+		much higher than in the preceding history years. The score is the
+		increase over the mean of those years, divided by the square root of
+		that mean (plus one), as expected for Poisson distributed counts.
+		"""
+		counts = self.counts.astype(float)
+		cumulative = np.cumsum(np.pad(counts, ((0, 0), (1, 0))), axis=1)
+		mean = (cumulative[:, history:-1] - cumulative[:, :-history-1]) / history
+		current = counts[:, history:]
+		scores = (current - mean) / np.sqrt(mean + 1)
+		rows, cols = np.nonzero((scores >= threshold) & (current >= min_count))
+		bursts = [(self.keys[r], int(self.first_year + history + c), float(scores[r, c]))
+		          for r, c in zip(rows, cols)]
+		return sorted(bursts, key=lambda burst: burst[2], reverse=True)
+
+
+def count_matrix(keys, rows, cols, num_cols, min_num=1):
+	"""Create TrendMatrix-like counts from parallel arrays of row (key) and
+	column (year) indices, dropping rows with less than min_num counts.
+	Returns the remaining keys and the count array.
+	"""
+	rows, cols = np.frombuffer(rows, dtype=np.uint32), np.frombuffer(cols, dtype=np.uint32)
+	keep = np.bincount(rows, minlength=len(keys)) >= min_num
+	new_rows = np.cumsum(keep) - 1
+	mask = keep[rows]
+	flat = new_rows[rows[mask]].astype(np.int64) * num_cols + cols[mask]
+	num_rows = int(keep.sum())
+	counts = np.bincount(flat, minlength=num_rows * num_cols)
+	return [key for key, k in zip(keys, keep) if k], counts.reshape(num_rows, num_cols)
+
+def build_trends(bibitems, n=1, stemming=False, min_num=1):
+	"""Count title n-grams (orders 1 up to n) and authors per year in one
+	pass over the bibliography items; items without year are skipped.
+	- min_num is the minimum total count for n-grams and authors to be kept
+	- returns tuple of TrendMatrix for n-grams and TrendMatrix for authors
+	"""
+	if not isinstance(bibitems, BibCorpus):
+		bibitems = BibCorpus(bibitems)
+	years = np.frombuffer(bibitems.years, dtype=np.uint16)
+	known = years[years > 0]
+	first_year = int(known.min()) if len(known) else 0
+	num_years = int(known.max()) - first_year + 1 if len(known) else 0
+
+	# n-grams, with word ID tuples mapped to row numbers
+	tokens = get_title_tokens(bibitems, stemming)
+	ngram_rows, ngram_keys = {}, []
+	rows, cols = array("I"), array("I")
+	for word_ids, year in zip(tokens.titles, bibitems.years):
+		if year:
+			for ngram in iter_ngrams(word_ids, n):
+				row = ngram_rows.get(ngram)
+				if row is None:
+					row = ngram_rows[ngram] = len(ngram_keys)
+					ngram_keys.append(ngram)
+				rows.append(row)
+				cols.append(year - first_year)
+	keys, counts = count_matrix(ngram_keys, rows, cols, num_years, min_num)
+	words = tokens.words
+	ngrams = TrendMatrix([" ".join(words[i] for i in key) for key in keys], first_year, counts)
+
+	# authors, directly from the corpus' author index
+	offsets = np.frombuffer(bibitems.author_offsets, dtype=np.uint64)
+	author_years = np.repeat(years, np.diff(offsets).astype(np.int64))
+	author_ids = np.frombuffer(bibitems.author_index, dtype=np.uint32)[author_years > 0]
+	author_cols = (author_years[author_years > 0] - first_year).astype(np.uint32)
+	keys, counts = count_matrix(bibitems.author_names, author_ids.tobytes(),
+	                            author_cols.tobytes(), num_years, min_num)
+	return ngrams, TrendMatrix(keys, first_year, counts)
+
+def author_profile(bibitems, author, n=1, stemming=False, number=10):
+	"""Get list of (n-gram, count) for the most frequent title n-grams in the
+	papers of the given author.
+	"""
+	if not isinstance(bibitems, BibCorpus):
+		bibitems = BibCorpus(bibitems)
+	tokens = get_title_tokens(bibitems, stemming)
+	offsets = np.frombuffer(bibitems.author_offsets, dtype=np.uint64)
+	item_of_author = np.repeat(np.arange(len(bibitems)), np.diff(offsets).astype(np.int64))
+	author_index = np.frombuffer(bibitems.author_index, dtype=np.uint32)
+	items = np.unique(item_of_author[author_index == bibitems.author_ids[author]])
+	profile = Counter(ngram for i in items for ngram in iter_ngrams(tokens.titles[i], n))
+	return [(" ".join(tokens.words[i] for i in key), num) for key, num in profile.most_common(number)]
+
+
+# testing
+if __name__ == "__main__":
+	from pprint import pprint
+	import bib_cache
+	items = bib_cache.parse_bib_cached("literature.bib")
+	ngrams, authors = build_trends(items, n=2, min_num=3)
+	pprint(ngrams.rising(10))
+	pprint(ngrams.declining(10))
+	pprint(authors.bursts()[:10])
@@ -7,24 +7,21 @@ by Tobias Küster, 2015
 """
 
 import bib_analyzer
-import subprocess
+import bib_export
 
-def create_authors_graph(bibitems, call_graphviz=False):
+def create_authors_graph(bibitems, call_graphviz=False, filename="authors_graph.dot",
+                         renderer="dot -Tps -o autoren.ps", **pruning):
 	"""Create a graph representing the co-author relationsships, using GraphViz.
+	Further keyword arguments (e.g. min_weight, top) are passed to
+	bib_export.prune, to keep the graph small enough for rendering.
 	"""
 	coauthors = bib_analyzer.get_coauthors(bibitems)
-	with open("authors_graph.dot", "w") as g:
-		g.write('graph "Co-Authors" {')
-		for a1, a2 in coauthors:
-			n = coauthors[(a1, a2)]
-			style = (' [style="bold" label="x%d"]' % n) if n > 1 else ''
-			g.write('\n\t "%s" -- "%s" %s;' % (a1, a2, style))
-		g.write("}")
+	bib_export.export_graph(coauthors, filename, "dot", **pruning)
 	if call_graphviz:
-		subprocess.call("dot -Tps -o autoren.ps authors_graph.dot".split())
+		bib_export.render_graph(filename, renderer)
 
 
 if __name__ == "__main__":
-	import bib_parser
-	items = bib_parser.parse_bib_from_bibtex("literature.bib")
-	create_authors_graph(items, True)
+	import bib_cache
+	items = bib_cache.parse_bib_cached("literature.bib")
+	create_authors_graph(items, True, min_weight=2, top=200)
@@ -0,0 +1,141 @@
+"""Picture Cache
+by Tobias Kuester, 2017
+
+Bounded caches for decoded pictures, used by both, Picture Rank and Picture
+Sort programs. Decoded images are kept up to a given budget of bytes, least
+recently used first out; the Tk images shown in the UI are kept separately,
+for fewer pictures, and are cheaply re-created from the decoded images.
+"""
+
+from collections import OrderedDict
+
+DEFAULT_BUDGET = 256 * 2**20   # bytes of decoded images to keep
+DEFAULT_PHOTOS = 16            # number of Tk images to keep
+
+
+def image_bytes(img):
+	"""Get approximate number of bytes used by the image's pixels."""
+	width, height = img.size
+	return width * height * len(img.getbands())
+
+
+class ImageCache:
+	"""LRU cache of PIL images with a budget of bytes.
+
+	Whenever adding an image exceeds the budget, the least recently used
+	images are evicted. Hits, misses and evictions are counted.
+	"""
+
+	def __init__(self, budget=DEFAULT_BUDGET):
+		"""Create empty cache with the given budget in bytes."""
+		self.budget = budget
+		self.items = OrderedDict()
+		self.size = 0
+		self.hits = self.misses = self.evictions = 0
+
+	def get(self, key, default=None):
+		"""Get image for key, marking it as recently used, or default."""
+		if key not in self.items:
+			self.misses += 1
+			return default
+		self.hits += 1
+		img = self.items.pop(key)
+		self.items[key] = img
+		return img
+
+	def put(self, key, img):
+		"""Add image for key, evicting least recently used images as needed.
+		Images larger than the entire budget are not added at all.
+		"""
+		self.discard(key)
+		size = image_bytes(img)
+		if size > self.budget:
+			return
+		while self.items and self.size + size > self.budget:
+			_, old = self.items.popitem(last=False)
+			self.size -= image_bytes(old)
+			self.evictions += 1
+		self.items[key] = img
+		self.size += size
+
+	def discard(self, key):
+		"""Remove image for key, if present."""
+		if key in self.items:
+			self.size -= image_bytes(self.items.pop(key))
+
+	def clear(self):
+		"""Remove all images; the statistics are kept."""
+		self.items.clear()
+		self.size = 0
+
+	def __contains__(self, key):
+		return key in self.items
+
+	def __len__(self):
+		return len(self.items)
+
+	def stats(self):
+		"""Get cache statistics as a string."""
+		return ("%d images, %.1f of %.1f MB, %d hits, %d misses, %d evictions"
+		        % (len(self.items), self.size / 2.**20, self.budget / 2.**20,
+		           self.hits, self.misses, self.evictions))
+
+
+class PhotoCache:
+	"""Cache of Tk images backed by an ImageCache of decoded images.
+
+	Only the most recently used Tk images are kept; the others are re-created
+	from the decoded images when needed, without reading the files again.
+	The factory creating the Tk images is passed in, e.g. ImageTk.PhotoImage,
+	so this module does not depend on Tk.
+	"""
+
+	def __init__(self, factory, budget=DEFAULT_BUDGET, photos=DEFAULT_PHOTOS):
+		"""Create empty cache with the given budget of bytes of decoded
+		images, and the maximum number of Tk images.
+		"""
+		self.factory = factory
+		self.images = ImageCache(budget)
+		self.photos = OrderedDict()
+		self.max_photos = photos
+
+	def get(self, key, default=None):
+		"""Get Tk image for key, re-creating it if necessary, or default if
+		the decoded image is not in the cache (any more).
+		"""
+		img = self.images.get(key)
+		if img is None:
+			self.photos.pop(key, None)
+			return default
+		photo = self.photos.pop(key) if key in self.photos else self.factory(img)
+		self.photos[key] = photo
+		while len(self.photos) > self.max_photos:
+			self.photos.popitem(last=False)
+		return photo
+
+	def put(self, key, img):
+		"""Add decoded image for key; the Tk image is created when needed."""
+		self.photos.pop(key, None)
+		self.images.put(key, img)
+
+	def clear(self):
+		"""Remove all images."""
+		self.images.clear()
+		self.photos.clear()
+
+	def __contains__(self, key):
+		return key in self.images
+
+	def stats(self):
+		"""Get cache statistics as a string."""
+		return self.images.stats()
+
+
+# testing
+if __name__ == "__main__":
+	from PIL import Image
+	cache = ImageCache(budget=3 * 100 * 100 * 3)
+	for i in range(5):
+		cache.put(i, Image.new("RGB", (100, 100)))
+		cache.get(0)
+	print(list(cache.items), cache.stats())
@@ -2,18 +2,279 @@
 by Tobias Kuester, 2015
 
 UI independent parts of the Picture Rank util: Finding all the pictures in a
-given directory and, most importantly, the algorithms for randomly selecting
-pairs of pictures and for ranking the pictures against each other, as well as
-the data structures holding the pictures and their ranking itself.
+given directory and, most importantly, the algorithms for selecting pairs of
+pictures and for ranking the pictures against each other, as well as the
+data structures holding the pictures and their ranking itself.
+
+Pairs are selected by one of several schedulers:
+- random: uniformly random pairs
+- uncertainty: the picture compared least often, against the closest rank
+- swiss: Swiss-tournament rounds, pairing pictures with similar ranks
+- top: like uncertainty, but focusing on the top k pictures
 """
 
 import os.path
 import random
 import json
+import bisect
+import heapq
+from collections import deque
 
 JSON_FILENAME = "picture-rank.json"
 IMG_EXTENSIONS = "jpg", "jpeg", "png", "gif"
 DEFAULT_RANK = 1200
+DEFAULT_STRATEGY = "random"
+K_FACTOR = 20       # Elo K-factor
+SWISS_WINDOW = 5    # number of next-ranked pictures to try in Swiss pairing
+TOP_K = 20          # number of pictures to focus on in top strategy
+EXPLORE = 0.25      # probability of exploring other pictures in top strategy
+BUCKET_SIZE = 64    # typical number of items per bucket of sorted list
+
+
+def expected_score(r1, r2):
+	"""Get probability that picture with rank r1 wins against rank r2."""
+	return 1. / (1 + 10**((r2 - r1) / 400.))
+
+def update_elo(pictures, pic1, pic2, outcome):
+	"""Update the ranks for the given two pictures, based on the outcome.
+	Outcome relative to pic1: 1.0: won; 0.5: draw; 0.0: lost.
+	Based on formula from https://de.wikipedia.org/wiki/Elo-Zahl#Berechnung
+	"""
+	r1, r2 = pictures[pic1], pictures[pic2]   # current ranking
+	e1 = expected_score(r1, r2)       # probability that pic1 wins
+	s1 = outcome              # games won (one game -> 1, 0.5, or 0)
+	pictures[pic1] += K_FACTOR * (s1 - e1) # update ranks of pic1 and pic2
+	pictures[pic2] += K_FACTOR * (e1 - s1) # = K((1-s1)-(1-e1)) = K(s2-e2)
+
+
+class RandomScheduler:
+	"""Random Scheduler class.
+
+	Base class for pair schedulers, which get the dict of pictures and ranks
+	and are notified about each update of ranks. This one selects pairs
+	uniformly at random.
+	"""
+
+	def __init__(self, pictures):
+		"""Create scheduler for the pictures, a dict of pictures and ranks."""
+		self.pictures = pictures
+		self.names = list(pictures)
+
+	def next_pair(self):
+		"""Get pair of pictures for next tournament."""
+		return tuple(random.sample(self.names, 2))
+
+	def update(self, *pics):
+		"""Notify scheduler about changed ranks of the given pictures."""
+		pass
+
+
+class SortedBuckets:
+	"""Sorted Buckets class.
+
+	Sorted list of items, split into buckets of about BUCKET_SIZE items, with
+	the largest item of each bucket in a separate list. Adding and removing
+	an item takes O(log n) for finding its bucket using bisect, plus O(b) for
+	changing the bucket, instead of the O(n) for changing a single list.
+	Buckets are split when they get too large and dropped when empty; this
+	changes the list of buckets, but is rare enough to be O(n/b^2) amortized.
+	"""
+
+	def __init__(self, items=()):
+		items = sorted(items)
+		self.buckets = [items[i:i+BUCKET_SIZE] for i in range(0, len(items), BUCKET_SIZE)]
+		self.maxes = [bucket[-1] for bucket in self.buckets]
+
+	def __len__(self):
+		return sum(map(len, self.buckets))
+
+	def __iter__(self):
+		return (item for bucket in self.buckets for item in bucket)
+
+	def __reversed__(self):
+		return (item for bucket in reversed(self.buckets) for item in reversed(bucket))
+
+	def _locate(self, item):
+		"""Get bucket number and position in bucket of the given item."""
+		k = bisect.bisect_left(self.maxes, item)
+		return k, bisect.bisect_left(self.buckets[k], item)
+
+	def add(self, item):
+		"""Add the item at its position in the sorted list."""
+		if not self.buckets:
+			self.buckets.append([item])
+			self.maxes.append(item)
+			return
+		k = min(bisect.bisect_left(self.maxes, item), len(self.maxes) - 1)
+		bucket = self.buckets[k]
+		bisect.insort(bucket, item)
+		self.maxes[k] = bucket[-1]
+		if len(bucket) > 2 * BUCKET_SIZE:
+			self.buckets[k:k+1] = bucket[:BUCKET_SIZE], bucket[BUCKET_SIZE:]
+			self.maxes[k:k+1] = bucket[BUCKET_SIZE-1], bucket[-1]
+
+	def remove(self, item):
+		"""Remove the item, which has to be in the list."""
+		k, i = self._locate(item)
+		bucket = self.buckets[k]
+		del bucket[i]
+		if bucket:
+			self.maxes[k] = bucket[-1]
+		else:
+			del self.buckets[k], self.maxes[k]
+
+	def neighbors(self, item):
+		"""Get list of the items just before and after the given item."""
+		k, i = self._locate(item)
+		bucket, neighbors = self.buckets[k], []
+		if i > 0 or k > 0:
+			neighbors.append(bucket[i-1] if i > 0 else self.buckets[k-1][-1])
+		if i + 1 < len(bucket) or k + 1 < len(self.buckets):
+			neighbors.append(bucket[i+1] if i + 1 < len(bucket) else self.buckets[k+1][0])
+		return neighbors
+
+	def largest(self, num):
+		"""Get list of the num largest items, largest first."""
+		largest = []
+		for bucket in reversed(self.buckets):
+			largest.extend(reversed(bucket[-(num - len(largest)):]))
+			if len(largest) >= num:
+				break
+		return largest
+
+
+class RatingScheduler(RandomScheduler):
+	"""Rating Scheduler class.
+
+	Base class for schedulers selecting pairs by their current ranks. Keeps
+	(rank, picture) tuples in SortedBuckets, so updating the rank of a picture
+	and finding the closest rank take O(log n), and the number of times each
+	picture has been selected.
+	"""
+
+	def __init__(self, pictures):
+		RandomScheduler.__init__(self, pictures)
+		self.ranks = dict(pictures)
+		self.ordered = SortedBuckets((r, p) for p, r in pictures.items())
+		self.selected = dict.fromkeys(pictures, 0)
+
+	def update(self, *pics):
+		for pic in pics:
+			self.ordered.remove((self.ranks[pic], pic))
+			self.ranks[pic] = self.pictures[pic]
+			self.ordered.add((self.ranks[pic], pic))
+
+	def closest(self, pic):
+		"""Get the picture with the rank closest to the given picture's."""
+		rank = self.ranks[pic]
+		neighbors = self.ordered.neighbors((rank, pic))
+		return min(neighbors, key=lambda x: (abs(x[0] - rank), random.random()))[1]
+
+	def select(self, pic1, pic2):
+		"""Count the selection of the given pair; get the pair."""
+		self.selected[pic1] += 1
+		self.selected[pic2] += 1
+		return pic1, pic2
+
+
+class UncertaintyScheduler(RatingScheduler):
+	"""Uncertainty Scheduler class.
+
+	Selects the picture selected least often so far, i.e. the one with the
+	most uncertain rank, using a heap with lazily removed outdated entries,
+	and pairs it with the picture with the closest rank. The heap is rebuilt
+	when it gets much larger than the number of pictures, in amortized O(1).
+	"""
+
+	def __init__(self, pictures):
+		RatingScheduler.__init__(self, pictures)
+		self.heap = [(0, random.random(), pic) for pic in pictures]
+		heapq.heapify(self.heap)
+
+	def next_pair(self):
+		return self.select(self.least_selected(), None)
+
+	def least_selected(self):
+		"""Get the picture selected least often."""
+		while True:
+			count, _, pic = heapq.heappop(self.heap)
+			if count == self.selected[pic]:
+				return pic
+
+	def select(self, pic1, pic2):
+		pic2 = pic2 or self.closest(pic1)
+		for pic in RatingScheduler.select(self, pic1, pic2):
+			heapq.heappush(self.heap, (self.selected[pic], random.random(), pic))
+		if len(self.heap) > 4 * len(self.selected):
+			self.compact()
+		return pic1, pic2
+
+	def compact(self):
+		"""Rebuild the heap from the current counts, dropping the outdated
+		entries, which are otherwise only dropped when popping them.
+		"""
+		self.heap = [(count, random.random(), pic) for pic, count in self.selected.items()]
+		heapq.heapify(self.heap)
+
+
+class TopScheduler(UncertaintyScheduler):
+	"""Top Scheduler class.
+
+	Like the uncertainty scheduler, but selecting the least often selected
+	picture among the 2k best pictures, to get the order of the top k right,
+	and only sometimes exploring the others.
+	"""
+
+	def __init__(self, pictures, k=TOP_K):
+		UncertaintyScheduler.__init__(self, pictures)
+		self.k = k
+
+	def next_pair(self):
+		if random.random() < EXPLORE:
+			return UncertaintyScheduler.next_pair(self)
+		top = self.ordered.largest(2 * self.k)
+		pic = min(top, key=lambda x: (self.selected[x[1]], random.random()))[1]
+		return self.select(pic, None)
+
+
+class SwissScheduler(RatingScheduler):
+	"""Swiss Scheduler class.
+
+	Selects pairs in rounds, as in a Swiss-system tournament: in each round,
+	each picture is paired with one of the next pictures by rank that it has
+	not been compared with before.
+	"""
+
+	def __init__(self, pictures):
+		RatingScheduler.__init__(self, pictures)
+		self.round = deque()
+		self.played = set()
+
+	def next_pair(self):
+		if not self.round:
+			self.new_round()
+		return self.round.popleft()
+
+	def new_round(self):
+		"""Pair all pictures by their current ranks for the next round."""
+		unpaired = deque(pic for _, pic in reversed(self.ordered))
+		pairs = []
+		while len(unpaired) > 1:
+			pic1 = unpaired.popleft()
+			window = min(SWISS_WINDOW, len(unpaired))
+			i = next((i for i in range(window)
+			          if frozenset((pic1, unpaired[i])) not in self.played), 0)
+			pic2 = unpaired[i]
+			del unpaired[i]
+			self.played.add(frozenset((pic1, pic2)))
+			pairs.append(self.select(pic1, pic2))
+		random.shuffle(pairs)
+		self.round.extend(pairs)
+
+
+# pair schedulers by strategy name
+SCHEDULERS = {"random": RandomScheduler, "uncertainty": UncertaintyScheduler,
+              "swiss": SwissScheduler, "top": TopScheduler}
 
 class PictureRank:
 	"""Picture Rank class.
@@ -22,9 +283,10 @@ class PictureRank:
 	algorithms for selecting the next tournament pair and for updating ranks.
 	"""
 	
-	def __init__(self, directory):
+	def __init__(self, directory, strategy=DEFAULT_STRATEGY):
 		"""Get all image files from given directory and initialize ranking. If
-		exists, update ranking with those from previous execution.
+		exists, update ranking with those from previous execution. Pairs are
+		selected by the scheduler for the given strategy, see SCHEDULERS.
 		"""
 		self.directory = directory
 		self.pictures = {pic: DEFAULT_RANK for pic in next(os.walk(directory))[2]
@@ -35,6 +297,7 @@ class PictureRank:
 				old_ranks = json.load(f)
 				self.pictures.update({p: r for p, r in old_ranks.items() 
 				                           if p in self.pictures})
+		self.scheduler = SCHEDULERS[strategy](self.pictures)
 
 	def __del__(self):
 		"""On exit, write current rankings to file."""
@@ -44,7 +307,11 @@ class PictureRank:
 		
 	def get_random_pair(self):
 		"""Get random pair of pictures for next tournament."""
-		return random.sample(self.pictures.keys(), 2)
+		return random.sample(list(self.pictures), 2)
+
+	def get_pair(self):
+		"""Get pair of pictures for next tournament, from the scheduler."""
+		return self.scheduler.next_pair()
 
 	def path(self, f):
 		"""Get full path for given file, relative to parent directory."""
@@ -54,19 +321,15 @@ class PictureRank:
 		"""Get or set the rank for the given pictures."""
 		if value:
 			self.pictures[pic] = value
+			self.scheduler.update(pic)
 		return self.pictures[pic]
 
 	def update_rank(self, pic1, pic2, outcome):
-		"""Update the ranks for the given two pictures, based on the outcome.
-		Outcome relative to pic1: 1.0: won; 0.5: draw; 0.0: lost.
-		Based on formula from https://de.wikipedia.org/wiki/Elo-Zahl#Berechnung
+		"""Update the ranks for the given two pictures, based on the outcome,
+		see update_elo, and notify the scheduler about the new ranks.
 		"""
-		K = 20                                            # K-factor
-		r1, r2 = self.pictures[pic1], self.pictures[pic2] # current ranking
-		e1 = 1. / (1 + 10**((r2 - r1)/400))    # probability that pic1 wins
-		s1 = outcome                 # games won (one game -> 1, 0.5, or 0)
-		self.pictures[pic1] += K * (s1 - e1) # update ranks of pic1 and pic2
-		self.pictures[pic2] += K * (e1 - s1) # = K((1-s1)-(1-e1)) = K(s2-e2)
+		update_elo(self.pictures, pic1, pic2, outcome)
+		self.scheduler.update(pic1, pic2)
 		
 	def get_best(self, number=None):
 		"""Get N best pictures, sorted by their rank."""
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+
+"""Simulation benchmark for the pair schedulers of picturerank.py.
+by Tobias Kuester, 2015
+
+Simulates ranking pictures with known "true" ranks, where the outcome of
+each comparison is drawn using the Elo winning probability of the true ranks,
+and reports for each strategy how many votes it takes until the top k of the
+current ranking contain the given fraction of the true top k.
+
+Usage: picturerank_bench.py [Options]
+"""
+
+import random
+import time
+from picturerank import SCHEDULERS, DEFAULT_RANK, expected_score, update_elo
+
+
+def simulate(strategy, number, k, precision, max_votes, seed=0):
+	"""Simulate ranking number pictures with the given strategy; get number
+	of votes until the top k are recovered with given precision, or None.
+	"""
+	random.seed(seed)
+	truth = {pic: random.gauss(DEFAULT_RANK, 200) for pic in range(number)}
+	true_top = set(sorted(truth, key=truth.get)[-k:])
+	pictures = dict.fromkeys(truth, DEFAULT_RANK)
+	scheduler = SCHEDULERS[strategy](pictures)
+	for votes in range(1, max_votes + 1):
+		pic1, pic2 = scheduler.next_pair()
+		outcome = 1. if random.random() < expected_score(truth[pic1], truth[pic2]) else 0.
+		update_elo(pictures, pic1, pic2, outcome)
+		scheduler.update(pic1, pic2)
+		if votes % 10 == 0:
+			top = sorted(pictures, key=pictures.get)[-k:]
+			if len(true_top.intersection(top)) >= precision * k:
+				return votes
+	return None
+
+
+def main():
+	"""Parse command line options and run the simulation.
+	"""
+	import optparse
+
+	parser = optparse.OptionParser("picturerank_bench.py [Options]")
+	parser.add_option("-n", "--number", dest="number", type="int", default=1000,
+	                  help="number of pictures")
+	parser.add_option("-k", "--top", dest="k", type="int", default=20,
+	                  help="number of top pictures to recover")
+	parser.add_option("-p", "--precision", dest="precision", type="float", default=0.8,
+	                  help="fraction of true top k that have to be in the top k")
+	parser.add_option("-m", "--max-votes", dest="max_votes", type="int", default=100000,
+	                  help="maximum number of votes per run")
+	parser.add_option("-r", "--runs", dest="runs", type="int", default=5,
+	                  help="number of runs per strategy")
+	(options, args) = parser.parse_args()
+
+	for strategy in sorted(SCHEDULERS):
+		start = time.time()
+		results = [simulate(strategy, options.number, options.k, options.precision,
+		                    options.max_votes, seed) for seed in range(options.runs)]
+		done = sorted(r for r in results if r is not None)
+		print("%-12s median votes: %8s   recovered: %d/%d   time: %6.2f s"
+		      % (strategy, done[len(done) // 2] if done else "-", len(done),
+		         options.runs, time.time() - start))
+
+if __name__ == "__main__":
+	main()
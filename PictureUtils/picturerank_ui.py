@@ -11,10 +11,15 @@ mouse controls. Also stuff for starting the application.
 import Tkinter as tkinter
 import tkFileDialog as filedialog
 import picturerank
-from PIL import Image, ImageTk
-from pictureutil import auto_rotate
+from collections import deque
+from PIL import ImageTk
+from picturecache import PhotoCache, DEFAULT_BUDGET
+from picturestore import ThumbnailStore, cache_directory
+from pictureutil import Prefetcher
 
 DELIMITER = " - "
+PREFETCH_PAIRS = 3   # number of upcoming pairs to prefetch
+POLL_INTERVAL = 50   # ms between checking for prefetched pictures
 
 class PictureRankUI(tkinter.Frame):
 	"""Picture Rank Frame.
@@ -23,18 +28,23 @@ class PictureRankUI(tkinter.Frame):
 	list showing the current rankings and providing keyboard and mouse controls.
 	"""
 	
-	def __init__(self, master, ranker, size):
+	def __init__(self, master, ranker, size, budget=DEFAULT_BUDGET, store=None):
 		"""Create picture ranking frame instance, creating two labels for the
 		pictures and a listbox for the ranking. The UI is controlled via arrow
 		keys, and pictures can be selected from the list using the mouse.
+		Decoded pictures are cached up to the given budget in bytes, and
+		thumbnails are stored persistently in the given ThumbnailStore.
 		"""
 		tkinter.Frame.__init__(self, master)
 		self.master.title("Picture Rank")
 		self.grid()
 		self.ranker = ranker
 		self.current = None
-		self.images = {}
+		self.images = PhotoCache(ImageTk.PhotoImage, budget)
 		self.size = size
+		self.upcoming = deque()
+		self.store = store or ThumbnailStore(ranker.directory)
+		self.prefetcher = Prefetcher(ThumbnailStore.load)
 
 		self.label1 = tkinter.Label(self, width=size, height=size)
 		self.label1.bind("<ButtonRelease>", lambda e: self.select(1.0))
@@ -50,8 +60,9 @@ class PictureRankUI(tkinter.Frame):
 		self.ranking.bind('<ButtonRelease>', self.from_ranking)
 		self.ranking.grid(row=0, column=2)
 		
-		self.set_random_images()
+		self.set_next_images()
 		self.update_ranking()
+		self.poll_images()
 	
 	def handle_keys(self, event):
 		"""Handle key events for advancing the tournament and other stuff.
@@ -74,7 +85,7 @@ class PictureRankUI(tkinter.Frame):
 		if self.current:
 			pic1, pic2 = self.current
 			self.ranker.update_rank(pic1, pic2, outcome)
-		self.set_random_images()
+		self.set_next_images()
 		self.update_ranking()
 		
 	def update_ranking(self):
@@ -100,25 +111,55 @@ class PictureRankUI(tkinter.Frame):
 		if event.num == 3:
 			self.set_images(pic1, pic_sel)
 			
-	def set_random_images(self):
-		"""Get random pair of images for next tournament and show them."""
-		pic1, pic2 = self.ranker.get_random_pair()
+	def set_next_images(self):
+		"""Get next pair of images for next tournament and show them.
+		The pairs after that are drawn in advance, so their pictures can be
+		prefetched in the background while the current ones are shown.
+		"""
+		while len(self.upcoming) <= PREFETCH_PAIRS:
+			self.upcoming.append(self.ranker.get_pair())
+		pic1, pic2 = self.upcoming.popleft()
 		self.set_images(pic1, pic2)
 		
 	def set_images(self, pic1, pic2):
-		"""Show the given pictures in the two labels."""
-		self.label1.configure(image=self.load_image(pic1))
-		self.label2.configure(image=self.load_image(pic2))
+		"""Show the given pictures in the two labels, or leave the labels
+		empty until the pictures have been loaded in the background.
+		"""
 		self.current = pic1, pic2
+		self.prefetcher.cancel()
+		for pic in self.current:
+			self.load_image(pic, True)
+		for pair in self.upcoming:
+			for pic in pair:
+				self.load_image(pic)
+		self.show_images()
+
+	def show_images(self):
+		"""Show the current pictures, as far as they are loaded."""
+		pic1, pic2 = self.current
+		self.label1.configure(image=self.images.get(pic1, ""))
+		self.label2.configure(image=self.images.get(pic2, ""))
 		
-	def load_image(self, pic):
-		"""Load the given picture using imaging library. Images are cached."""
+	def load_image(self, pic, urgent=False):
+		"""Request loading the given picture in the background, unless it has
+		already been loaded. Images are cached.
+		"""
 		if pic not in self.images:
-			path = self.ranker.path(pic)
-			img = auto_rotate(Image.open(path))
-			img.thumbnail((self.size, self.size))
-			self.images[pic] = ImageTk.PhotoImage(img)
-		return self.images[pic]
+			self.prefetcher.request(pic, (self.store, pic, self.size), urgent)
+
+	def poll_images(self):
+		"""Cache pictures loaded in the background, and show them if they
+		are current; then check again after a short time.
+		"""
+		results = self.prefetcher.poll()
+		for pic, img, error in results:
+			if error is None:
+				self.images.put(pic, img)
+			else:
+				print("Could not load %s: %s" % (pic, error))
+		if any(pic in self.current for pic, _, _ in results):
+			self.show_images()
+		self.after(POLL_INTERVAL, self.poll_images)
 
 
 def main():
@@ -131,14 +172,24 @@ def main():
 	parser = optparse.OptionParser("picturerank_ui.py [Options] [Directory]")
 	parser.add_option("-s", "--size", dest="size", 
 					  help="size of image previews")
+	parser.add_option("-c", "--cache", dest="cache", type="int",
+					  help="MB of decoded images to keep in memory")
+	parser.add_option("-x", "--xdg-cache", dest="xdg", action="store_true",
+					  help="store thumbnails in user's cache directory")
+	parser.add_option("-t", "--strategy", dest="strategy", default=picturerank.DEFAULT_STRATEGY,
+					  choices=sorted(picturerank.SCHEDULERS),
+					  help="strategy for selecting pairs: %s" % ", ".join(sorted(picturerank.SCHEDULERS)))
 	(options, args) = parser.parse_args()
 	
 	size = int(options.size) if options.size else 400
 	directory = args[0] if args else filedialog.askdirectory()
 
-	ranker = picturerank.PictureRank(directory)
-	PictureRankUI(root, ranker, size)
+	ranker = picturerank.PictureRank(directory, options.strategy)
+	budget = options.cache * 2**20 if options.cache else DEFAULT_BUDGET
+	store = ThumbnailStore(directory, cache_directory(directory) if options.xdg else None)
+	ui = PictureRankUI(root, ranker, size, budget, store)
 	root.mainloop()
+	print("Image cache: %s" % ui.images.stats())
 	
 if __name__ == "__main__":
 	main()
@@ -24,11 +24,15 @@ import Tkinter as tkinter
 import tkFileDialog as filedialog
 import tkSimpleDialog as simpledialog
 import tkMessageBox as messagebox
-from PIL import Image, ImageTk
+from PIL import ImageTk
 import os
-from pictureutil import auto_rotate
+from picturecache import PhotoCache, DEFAULT_BUDGET
+from picturestore import ThumbnailStore, cache_directory
+from pictureutil import Prefetcher
 
 IMG_EXTENSIONS = "jpg", "jpeg", "png", "gif"
+NEIGHBOURS = 3       # number of pictures before and after to prefetch
+POLL_INTERVAL = 50   # ms between checking for prefetched pictures
 
 
 class PictureSortUI(tkinter.Frame):
@@ -39,15 +43,21 @@ class PictureSortUI(tkinter.Frame):
 	pictures, and a large preview of the currently selected picture.
 	"""
 	
-	def __init__(self, master, size, directory=None):
+	def __init__(self, master, size, directory=None, budget=DEFAULT_BUDGET, xdg_cache=False):
 		"""Create PictureSortUI instance, containing list of image files,
 		large preview, and some buttons for re-ordering and renaming.
+		Decoded pictures are cached up to the given budget in bytes, and
+		thumbnails are stored in ".thumbnails" or the user's cache directory.
 		"""
 		tkinter.Frame.__init__(self, master)
 		self.master.title("Picture Sorter")
-		self.images = {}
+		self.images = PhotoCache(ImageTk.PhotoImage, budget)
 		self.size = size
 		self.directory = directory
+		self.current = None
+		self.xdg_cache = xdg_cache
+		self.store = None
+		self.prefetcher = Prefetcher(ThumbnailStore.load)
 		self.pattern = "Untitled"
 		self.grid()
 		
@@ -86,6 +96,7 @@ class PictureSortUI(tkinter.Frame):
 
 		self.bind_all("<KeyRelease-q>", lambda e: self.quit())
 		self.open_directory(False)
+		self.poll_images()
 
 	def move(self, delta):
 		"""Move selected list elements by delta positions (positive means
@@ -108,6 +119,8 @@ class PictureSortUI(tkinter.Frame):
 			self.directory = filedialog.askdirectory() or self.directory
 			self.images.clear()
 		if self.directory:
+			self.store = ThumbnailStore(self.directory,
+					cache_directory(self.directory) if self.xdg_cache else None)
 			pictures = [pic for pic in next(os.walk(self.directory))[2]
 							 if pic.split(".")[-1].lower() in IMG_EXTENSIONS]
 
@@ -164,24 +177,50 @@ class PictureSortUI(tkinter.Frame):
 	
 	def show_preview(self, event):
 		"""Get currently selected picture from list, if any, and show it
-		in the preview.
+		in the preview, as soon as it is loaded. Neighbouring pictures in the
+		list are prefetched in the background.
 		"""
 		index = self.piclist.curselection()
 		if index:
-			selection = self.piclist.get(index[0])
-			self.preview.delete("all")
+			first = int(index[0])
+			self.current = self.path(self.piclist.get(first))
+			self.prefetcher.cancel()
+			self.load_image(self.current, True)
+			for delta in range(1, NEIGHBOURS + 1):
+				for i in (first + delta, first - delta):
+					if 0 <= i < self.piclist.size():
+						self.load_image(self.path(self.piclist.get(i)))
+			self.draw_preview()
+
+	def draw_preview(self):
+		"""Show the current picture in the preview, if it is loaded."""
+		self.preview.delete("all")
+		image = self.images.get(self.current)
+		if image is not None:
 			x, y = self.preview.winfo_width() / 2, self.preview.winfo_height() / 2
-			self.preview.create_image((x, y), image=self.load_image(selection))
+			self.preview.create_image((x, y), image=image)
 			
-	def load_image(self, pic):
-		"""Load the given picture using imaging library. Images are cached.
+	def load_image(self, path, urgent=False):
+		"""Request loading the given picture in the background, unless it has
+		already been loaded. Images are cached.
 		"""
-		if pic not in self.images:
-			path = self.path(pic)
-			img = auto_rotate(Image.open(path))
-			img.thumbnail((self.size, self.size))
-			self.images[pic] = ImageTk.PhotoImage(img)
-		return self.images[pic]
+		if path not in self.images:
+			pic = os.path.basename(path)
+			self.prefetcher.request(path, (self.store, pic, self.size), urgent)
+
+	def poll_images(self):
+		"""Cache pictures loaded in the background, and show the current
+		one; then check again after a short time.
+		"""
+		results = self.prefetcher.poll()
+		for path, img, error in results:
+			if error is None:
+				self.images.put(path, img)
+			else:
+				print("Could not load %s: %s" % (path, error))
+		if any(path == self.current for path, _, _ in results):
+			self.draw_preview()
+		self.after(POLL_INTERVAL, self.poll_images)
 
 
 def main():
@@ -192,13 +231,19 @@ def main():
 	parser = optparse.OptionParser("picturesort_ui.py [Options] [Directory]")
 	parser.add_option("-s", "--size", dest="size",
 					  help="size of image previews")
+	parser.add_option("-c", "--cache", dest="cache", type="int",
+					  help="MB of decoded images to keep in memory")
+	parser.add_option("-x", "--xdg-cache", dest="xdg", action="store_true",
+					  help="store thumbnails in user's cache directory")
 	(options, args) = parser.parse_args()
 
 	size = int(options.size or 500)
 	directory = args[0] if args else None
 
-	PictureSortUI(root, size, directory)
+	budget = options.cache * 2**20 if options.cache else DEFAULT_BUDGET
+	ui = PictureSortUI(root, size, directory, budget, options.xdg)
 	root.mainloop()
+	print("Image cache: %s" % ui.images.stats())
 	
 if __name__ == "__main__":
 	main()
@@ -0,0 +1,165 @@
+"""Picture Store
+by Tobias Kuester, 2017
+
+Persistent store of picture thumbnails, used by both, Picture Rank and Picture
+Sort programs, so pictures do not have to be decoded again each time a folder
+is opened. Thumbnails are stored as JPEG files in a ".thumbnails" folder next
+to the pictures (or in the user's cache directory), for a few fixed sizes,
+and are keyed by the pictures' names, modification times and file sizes.
+
+New thumbnails are made from the embedded EXIF thumbnail, if that is large
+enough, or else from the picture decoded at reduced scale in draft mode.
+"""
+
+import os
+import hashlib
+import tempfile
+from io import BytesIO
+from PIL import Image
+from picturerank import IMG_EXTENSIONS
+from pictureutil import read_exif, orient
+
+STORE_DIRNAME = ".thumbnails"
+LEVELS = 128, 256, 512, 1024   # sizes of stored thumbnails
+QUALITY = 90                   # JPEG quality of stored thumbnails
+
+
+def digest(string):
+	"""Get SHA-1 hex digest of the string; byte strings, e.g. file names in
+	Python 2, are hashed as they are, others are encoded as UTF-8.
+	"""
+	if not isinstance(string, bytes):
+		string = string.encode("utf8")
+	return hashlib.sha1(string).hexdigest()
+
+def cache_directory(directory):
+	"""Get directory for the thumbnails of the given picture directory in
+	the user's cache directory, following the XDG base directory spec.
+	"""
+	base = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+	return os.path.join(base, "picture-utils", digest(os.path.abspath(directory)))
+
+
+class ThumbnailStore:
+	"""Thumbnail Store class.
+
+	Loads thumbnails of the pictures in a directory, making and storing them
+	if needed. Thumbnails of other sizes than those in LEVELS are scaled down
+	from the next larger stored level; larger ones are not stored at all.
+	"""
+
+	def __init__(self, directory, store_dir=None):
+		"""Create store for pictures in directory, storing thumbnails in
+		store_dir; by default, ".thumbnails" within that directory.
+		"""
+		self.directory = directory
+		self.store_dir = store_dir or os.path.join(directory, STORE_DIRNAME)
+
+	def key(self, pic):
+		"""Get key for picture's thumbnails, from name, mtime and size."""
+		stat = os.stat(os.path.join(self.directory, pic))
+		key = "%s|%d|%d" % (pic, int(stat.st_mtime), stat.st_size)
+		return digest(key)
+
+	def thumbnail_path(self, key, level):
+		"""Get path of the thumbnail with given key and level."""
+		return os.path.join(self.store_dir, "%s_%d.jpg" % (key, level))
+
+	def load(self, pic, size):
+		"""Get thumbnail of picture fitting in size, from the store if
+		possible; otherwise, make and store thumbnails for the next larger
+		and all smaller levels.
+		"""
+		levels = [level for level in LEVELS if level >= size]
+		if not levels:
+			return self.make(pic, size)
+		key = self.key(pic)
+		try:
+			img = Image.open(self.thumbnail_path(key, levels[0]))
+		except IOError:
+			img = self.make(pic, levels[0])
+			self.save(key, img, levels[0])
+		img.thumbnail((size, size))
+		img.load()
+		return img
+
+	def make(self, pic, size):
+		"""Make oriented thumbnail of picture fitting in size, from the EXIF
+		thumbnail if it is large enough, or else using draft mode.
+		"""
+		img = Image.open(os.path.join(self.directory, pic))
+		orientation, data = read_exif(img)
+		if data:
+			thumb = Image.open(BytesIO(data))
+			if max(thumb.size) >= min(size, max(img.size)):
+				img = thumb
+		img.draft(img.mode, (size, size))
+		img.thumbnail((size, size))
+		return orient(img.convert("RGB"), orientation)
+
+	def save(self, key, img, size):
+		"""Store thumbnail made for the given level, and scaled-down versions
+		for all smaller levels, replacing the files atomically.
+		"""
+		if not os.path.isdir(self.store_dir):
+			os.makedirs(self.store_dir)
+		img = img.copy()
+		for level in reversed(LEVELS):
+			if level <= size:
+				img.thumbnail((level, level))
+				fd, temp = tempfile.mkstemp(".jpg", dir=self.store_dir)
+				with os.fdopen(fd, "wb") as f:
+					img.save(f, "JPEG", quality=QUALITY)
+				os.rename(temp, self.thumbnail_path(key, level))
+
+	def clean(self, pictures):
+		"""Remove all stored thumbnails not belonging to the given pictures
+		in their current version, e.g. of deleted or modified pictures.
+		"""
+		keys = set(self.key(pic) for pic in pictures)
+		if os.path.isdir(self.store_dir):
+			for name in os.listdir(self.store_dir):
+				if name.split("_")[0] not in keys:
+					os.remove(os.path.join(self.store_dir, name))
+
+
+def prepare(task):
+	"""Load (and if needed make) thumbnail in worker process; returns error
+	message, if any.
+	"""
+	store, pic, size = task
+	try:
+		store.load(pic, size)
+	except Exception as e:
+		return "%s: %s" % (pic, e)
+
+
+def main():
+	"""Parse command line parameters and make thumbnails for all pictures
+	in the given directory, removing outdated ones.
+	"""
+	import optparse
+	from multiprocessing import Pool
+	parser = optparse.OptionParser("picturestore.py [Options] Directory")
+	parser.add_option("-s", "--size", dest="size", type="int", default=LEVELS[-1],
+					  help="size of largest thumbnails to make")
+	parser.add_option("-x", "--xdg-cache", dest="xdg", action="store_true",
+					  help="store thumbnails in user's cache directory")
+	(options, args) = parser.parse_args()
+	if len(args) != 1:
+		parser.error("Expected exactly one directory")
+
+	directory = args[0]
+	store = ThumbnailStore(directory, cache_directory(directory) if options.xdg else None)
+	pictures = [pic for pic in next(os.walk(directory))[2]
+	            if pic.split(".")[-1].lower() in IMG_EXTENSIONS]
+	store.clean(pictures)
+	pool = Pool()
+	for error in pool.imap_unordered(prepare, [(store, pic, options.size) for pic in pictures]):
+		if error:
+			print(error)
+	pool.close()
+	print("Thumbnails for %d pictures in %s" % (len(pictures), store.store_dir))
+
+if __name__ == "__main__":
+	main()
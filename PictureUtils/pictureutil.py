@@ -5,15 +5,142 @@ Utility class for functions and classes used by both, Picture Rank and
 Picture Sort programs.
 """
 
+import itertools
+import struct
+import threading
+try:
+	import Queue as queue
+except ImportError:
+	import queue
+from PIL import Image
+
+# transpositions for EXIF orientations 2 to 8; 1 is upright already
+ORIENTATIONS = {2: Image.FLIP_LEFT_RIGHT, 3: Image.ROTATE_180,
+                4: Image.FLIP_TOP_BOTTOM, 5: Image.TRANSPOSE,
+                6: Image.ROTATE_270, 7: Image.TRANSVERSE, 8: Image.ROTATE_90}
+
 def auto_rotate(img):
-	"""Auto-rotate image based on EXIF information; adapted from
-	http://www.lifl.fr/~damien.riquet/auto-rotating-pictures-using-pil.html
+	"""Auto-rotate image based on EXIF information. This loads the entire
+	image; for previews, use load_thumbnail instead.
 	"""
+	return orient(img, read_orientation(img))
+
+def read_exif(img):
+	"""Get EXIF orientation (1 if unknown) and embedded JPEG thumbnail (bytes,
+	or None) of the opened image, parsing the raw EXIF data, i.e. the TIFF
+	header, IFD0 and IFD1, without decoding any pixels.
+	"""
+	data = img.info.get("exif") or b""
+	if data.startswith(b"Exif\0\0"):
+		data = data[6:]
 	try:
-		exif = img._getexif()
-		orientation_key = 274 # cf ExifTags
-		orientation = exif[orientation_key]
-		rotate_values = {3: 180, 6: 270, 8: 90}
-		img = img.rotate(rotate_values[orientation])
-	finally:
-		return img
+		order = {b"II": "<", b"MM": ">"}[data[:2]]
+
+		def read_ifd(offset):
+			"""Get dict of tags to values (short or long) and next offset."""
+			count = struct.unpack(order + "H", data[offset:offset+2])[0]
+			end = offset + 2 + 12 * count
+			entries = {}
+			for i in range(offset + 2, end, 12):
+				tag, kind, _, value = struct.unpack(order + "HHL4s", data[i:i+12])
+				entries[tag] = struct.unpack(order + ("H" if kind == 3 else "L"),
+				                             value[:2 if kind == 3 else 4])[0]
+			return entries, struct.unpack(order + "L", data[end:end+4])[0]
+
+		ifd0, offset = read_ifd(struct.unpack(order + "L", data[4:8])[0])
+		orientation, thumbnail = ifd0.get(0x0112, 1), None
+		if offset:
+			ifd1, _ = read_ifd(offset)
+			start, length = ifd1.get(0x0201), ifd1.get(0x0202)
+			if start and length and start + length <= len(data):
+				thumbnail = data[start:start+length]
+		return orientation, thumbnail
+	except (KeyError, struct.error):
+		return 1, None
+
+def read_orientation(img):
+	"""Get EXIF orientation of the opened image, without decoding pixels."""
+	return read_exif(img)[0]
+
+def orient(img, orientation):
+	"""Rotate and/or flip image according to the given EXIF orientation."""
+	return img.transpose(ORIENTATIONS[orientation]) if orientation in ORIENTATIONS else img
+
+def load_thumbnail(path, size):
+	"""Load picture from path, scaled to fit in size and auto-rotated. JPEGs
+	are decoded at reduced scale in draft mode, and the picture is rotated
+	only after scaling it down; as size is the same for width and height,
+	the orientation does not matter for scaling.
+	"""
+	img = Image.open(path)
+	orientation = read_orientation(img)
+	img.draft(img.mode, (size, size))
+	img.thumbnail((size, size))
+	return orient(img, orientation)
+
+
+class Prefetcher:
+	"""Prefetcher decoding pictures in background threads.
+
+	Pictures are requested by key together with the arguments for the loader
+	function; urgent requests (the pictures to be shown right now) are handled
+	first, then the most recent other requests. Results are collected with
+	poll, which should be called regularly from the UI thread, e.g. using
+	Tk's after, as Tk images must only be created in that thread.
+	"""
+
+	def __init__(self, loader, workers=2):
+		"""Create prefetcher, starting the given number of worker threads."""
+		self.loader = loader
+		self.tasks = queue.PriorityQueue()
+		self.results = queue.Queue()
+		self.lock = threading.Lock()
+		self.queued = set()   # keys requested, but not yet started
+		self.taken = set()    # keys being loaded or not yet polled
+		self.counter = itertools.count()
+		for _ in range(workers):
+			thread = threading.Thread(target=self.work)
+			thread.daemon = True
+			thread.start()
+
+	def request(self, key, args, urgent=False):
+		"""Request loading the picture with given key, calling the loader
+		with the given arguments, unless it is already requested.
+		"""
+		with self.lock:
+			if key in self.taken or key in self.queued and not urgent:
+				return
+			self.queued.add(key)
+		count = next(self.counter)
+		self.tasks.put((0, count, key, args) if urgent else (1, -count, key, args))
+
+	def cancel(self):
+		"""Cancel all requests that have not been started yet."""
+		with self.lock:
+			self.queued.clear()
+
+	def poll(self):
+		"""Get list of (key, image, error) tuples for loaded pictures."""
+		results = []
+		while True:
+			try:
+				results.append(self.results.get_nowait())
+			except queue.Empty:
+				break
+		with self.lock:
+			self.taken.difference_update(key for key, _, _ in results)
+		return results
+
+	def work(self):
+		"""Worker thread loop, loading the requested pictures."""
+		while True:
+			_, _, key, args = self.tasks.get()
+			with self.lock:
+				if key not in self.queued:
+					continue  # cancelled, or duplicate of urgent request
+				self.queued.remove(key)
+				self.taken.add(key)
+			try:
+				self.results.put((key, self.loader(*args), None))
+			except Exception as e:
+				self.results.put((key, None, e))
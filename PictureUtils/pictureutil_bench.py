@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+"""Benchmark for loading picture previews with pictureutil.
+by Tobias Kuester, 2017
+
+Compares the old way of loading previews, decoding the entire picture and
+rotating it before scaling it down, with load_thumbnail, which reads the
+orientation without decoding pixels, decodes JPEGs in draft mode, and rotates
+only the scaled-down image. Each variant runs in its own process, so that the
+peak memory usage of that process can be reported, too.
+
+Usage: pictureutil_bench.py [Options]
+"""
+
+import os
+import random
+import resource
+import shutil
+import tempfile
+import time
+from multiprocessing import Pool
+from PIL import Image
+from pictureutil import load_thumbnail
+
+
+def legacy_load(path, size):
+	"""The old way of loading previews: decode, rotate, then scale down."""
+	img = Image.open(path)
+	try:
+		orientation = img._getexif()[274]
+		img = img.rotate({3: 180, 6: 270, 8: 90}[orientation])
+	except Exception:
+		pass
+	img.thumbnail((size, size))
+	return img
+
+def generate_pictures(directory, number, megapixels, seed=0):
+	"""Write number of JPEG pictures of about the given size with random
+	EXIF orientations to the directory; get list of their paths.
+	"""
+	rnd = random.Random(seed)
+	width = int((megapixels * 1e6 * 3 / 2) ** 0.5)
+	height = width * 2 // 3
+	# random noise would make decoding unrealistically slow, use gradient
+	base = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+	paths = []
+	for i in range(number):
+		exif = Image.Exif()
+		exif[0x0112] = rnd.randint(1, 8)
+		path = os.path.join(directory, "picture_%03d.jpg" % i)
+		base.save(path, "JPEG", quality=90, exif=exif.tobytes())
+		paths.append(path)
+	return paths
+
+def run(task):
+	"""Load all pictures with the given loader function in a fresh worker
+	process; get elapsed time and peak memory in MB of that process.
+	"""
+	name, paths, size = task
+	loader = {"legacy": legacy_load, "thumbnail": load_thumbnail}[name]
+	start = time.time()
+	for path in paths:
+		loader(path, size)
+	elapsed = time.time() - start
+	return elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+
+def main():
+	"""Parse command line options and run the benchmark.
+	"""
+	import optparse
+
+	parser = optparse.OptionParser("pictureutil_bench.py [Options]")
+	parser.add_option("-n", "--number", dest="number", type="int", default=20,
+	                  help="number of generated pictures")
+	parser.add_option("-m", "--megapixels", dest="megapixels", type="float", default=24,
+	                  help="size of generated pictures in megapixels")
+	parser.add_option("-s", "--size", dest="size", type="int", default=400,
+	                  help="size of previews")
+	(options, args) = parser.parse_args()
+
+	directory = tempfile.mkdtemp()
+	try:
+		paths = generate_pictures(directory, options.number, options.megapixels)
+		for name in ("legacy", "thumbnail"):
+			pool = Pool(1)
+			elapsed, peak = pool.apply(run, ((name, paths, options.size),))
+			pool.close()
+			print("%-10s %8.1f ms per picture  %8.1f MB peak memory"
+			      % (name, 1000 * elapsed / len(paths), peak))
+	finally:
+		shutil.rmtree(directory)
+
+if __name__ == "__main__":
+	main()
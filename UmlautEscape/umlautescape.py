@@ -4,13 +4,149 @@
 """A simple command-line tool for replacing Umlauts in HTML and Latex documents.
 by Tobias Küster, 2010
 
-Usage: umlautescape.py [Options] File
+Usage: umlautescape.py [Options] File|Directory|Glob...
 Options:
   -h, --help            show this help message and exit
   -m MODE, --mode=MODE  mode; one from ['latex', 'html']
   -i, --inverse         reverse substitution?
+  -c, --context         skip markup, code and math regions
+  --include=INCLUDE     process only files matching this pattern, e.g. '*.tex'
+  --exclude=EXCLUDE     skip files and directories matching this pattern
+  -j JOBS, --jobs=JOBS  number of worker processes; default: number of CPUs
+  --check, --dry-run    only check whether files need changes; exit with 1 if so
+  --cache=CACHE         JSON file for skipping files known not to need changes
 """
 
+import os
+import re
+import sys
+import json
+import hashlib
+import operator
+import glob
+import fnmatch
+import tempfile
+from functools import lru_cache
+
+# number of characters read at once when processing files
+CHUNK_SIZE = 1 << 20
+
+
+class Substitution:
+	"""Substitution of many patterns in a single pass over a string.
+
+	All keys of the table are combined into one regular expression, longest
+	keys first, so at each position the longest key is replaced (e.g. '---'
+	before '--'), and replacements are never substituted again. The string
+	is split at the matches, which are then looked up in the table.
+	"""
+
+	def __init__(self, tuples, inverse=False):
+		"""Create substitution for tuples (key, replacement), or the other way
+		round if inverse is set; for duplicate keys, the first one is used.
+		"""
+		self.table = {}
+		for key, value in tuples:
+			if inverse:
+				key, value = value, key
+			self.table.setdefault(key, value)
+		keys = sorted(self.table, key=len, reverse=True)
+		self.pattern = re.compile("(%s)" % ("|".join(map(re.escape, keys)) or "(?!)"))
+		self.maxlen = max(map(len, keys), default=0)
+		self.lookup = self.table.__getitem__
+
+	def sub(self, string):
+		"""Get string with all keys substituted."""
+		return self.subn(string)[0]
+
+	def sub_partial(self, buf, final=False):
+		"""Substitute keys in a buffer that may be followed by more text.
+		Unless final is set, the end of the buffer where a key could start
+		that is not complete yet is held back, i.e. any match (or text) that
+		starts less than maxlen characters before the end. Returns tuple of
+		substituted text, the rest of the buffer to be prepended to the next
+		one, and the number of substitutions made.
+		"""
+		parts = self.pattern.split(buf)
+		rest = ""
+		if not final:
+			cut, pos = len(buf) - self.maxlen + 1, len(buf)
+			while parts:
+				start = pos - len(parts[-1])
+				if start < cut:
+					if len(parts) % 2:   # text, keep everything before cut
+						rest = parts[-1][cut-start:] + rest
+						parts[-1] = parts[-1][:cut-start]
+					break
+				rest = parts.pop() + rest
+				pos = start
+		count = self._substitute(parts)
+		return "".join(parts), rest, count
+
+	def subn(self, string):
+		"""Get tuple of string with all keys substituted, and the number of
+		substitutions made.
+		"""
+		parts = self.pattern.split(string)
+		count = self._substitute(parts)
+		return "".join(parts), count
+
+	def _substitute(self, parts):
+		"""Replace the matches in the parts of a split string, and return
+		the number of matches actually changed by that.
+		"""
+		keys = parts[1::2]
+		parts[1::2] = values = list(map(self.lookup, keys))
+		return sum(map(operator.ne, keys, values))
+
+	def find_change(self, buf, final=False):
+		"""Check whether any match in the buffer would be changed, without
+		substituting anything; stops at the first such match. As in
+		sub_partial, matches near the end of the buffer are not considered
+		unless final is set. Returns tuple of the result, and the end of the
+		buffer to be prepended to the next one.
+		"""
+		cut = len(buf) if final else max(len(buf) - self.maxlen + 1, 0)
+		end = 0
+		for match in self.pattern.finditer(buf):
+			if match.start() >= cut:
+				break
+			if self.lookup(match.group()) != match.group():
+				return True, ''
+			end = match.end()
+		return False, buf[max(cut, end):]
+
+
+class TokenSubstitution(Substitution):
+	"""Substitution of all tokens matching a generic regular expression.
+
+	Instead of one alternative per key, the pattern matches any token that
+	may have a replacement, e.g. any non-ASCII character, which is then
+	looked up in the table, so the size of the table does not affect the
+	speed of matching. Tokens not in the table are normalized and looked up
+	again, and tokens still not found are passed to the default function.
+	"""
+
+	def __init__(self, pattern, table, maxlen, normalize=None, default=None, flags=0):
+		"""Create substitution for tokens matching the pattern (a string,
+		without groups) of at most maxlen characters.
+		"""
+		self.pattern = re.compile("(%s)" % pattern, flags)
+		self.table = table
+		self.maxlen = maxlen
+		get = table.get
+		default = default or (lambda token: token)
+		if normalize:
+			self.lookup = lambda token: get(token) or get(normalize(token)) or default(token)
+		else:
+			self.lookup = lambda token: get(token) or default(token)
+
+
+@lru_cache(maxsize=None)
+def get_substitution(tuples, inverse=False):
+	"""Get (cached) Substitution for a tuple of tuples."""
+	return Substitution(tuples, inverse)
+
 def replace(string, tuples, inverse=False):
 	"""Substitute Umlauts (or any other patterns) in a string.
 	@param string: string in which to replace the Umlauts
@@ -18,11 +154,7 @@ def replace(string, tuples, inverse=False):
 	@param inverse: if True, the escape sequences are subst. with the umlauts
 	@return: string with the umlauts being escaped (or reverted, if inverse set)
 	"""
-	for key, value in tuples:
-		if inverse:
-			key, value = value, key
-		string = string.replace(key, value)
-	return string
+	return get_substitution(tuple(map(tuple, tuples)), inverse).sub(string)
 
 # replacement tables for HTML and LaTeX
 HTML_TABLE  = [('ä', '&auml;'), ('Ä', '&Auml;'),
@@ -35,40 +167,490 @@ LATEX_TABLE = [('ä', '\\"{a}'), ('Ä', '\\"{A}'),
 			   ('ß', '\\ss{}') ]
 TABLES = {'html': HTML_TABLE, 'latex': LATEX_TABLE}
 
+# tokens for full HTML substitution: dashes and non-ASCII characters, and
+# named or numeric character references
+HTML_CHAR = r'---|--|[^\x00-\x7f]'
+HTML_REFERENCE = r'&(?:[A-Za-z][A-Za-z0-9]{0,31}|#[0-9]{1,7}|#[xX][0-9A-Fa-f]{1,6});'
+HTML_NUMERIC = re.compile(r'&#[xX]?([0-9A-Fa-f]+);')
+
+# LaTeX accents with combining characters, and special letter macros
+LATEX_ACCENTS = {'"': '\u0308', "'": '\u0301', '`': '\u0300', '^': '\u0302',
+                 '~': '\u0303', '=': '\u0304', '.': '\u0307', 'c': '\u0327',
+                 'k': '\u0328', 'v': '\u030c', 'u': '\u0306', 'H': '\u030b',
+                 'r': '\u030a', 'd': '\u0323', 'b': '\u0331'}
+LATEX_SPECIALS = {'ß': 'ss', 'æ': 'ae', 'Æ': 'AE', 'œ': 'oe', 'Œ': 'OE',
+                  'ø': 'o', 'Ø': 'O', 'å': 'aa', 'Å': 'AA', 'ł': 'l', 'Ł': 'L',
+                  'ı': 'i', 'ȷ': 'j', '§': 'S', '¶': 'P', '£': 'pounds',
+                  '©': 'copyright', '†': 'dag', '‡': 'ddag'}
+LATEX_TEXT = {'–': '--', '—': '---', '“': '``', '”': "''", '‘': '`', '’': "'",
+              '¡': '!`', '¿': '?`', '\xa0': '~'}
+
+# tokens for inverse LaTeX substitution: \"{a}, \"a, \" a, \c{c}, \c c,
+# \ss{}, {\ss}, \ss followed by a space or non-letter, etc.
+LATEX_TOKEN = r'''\\[."'`^~=]\ ?(?:\{\\?[A-Za-z]\}|[A-Za-z]|\\[ij](?![A-Za-z]))
+                 |\\[ckvuHrdb](?:\{\\?[A-Za-z]\}|\ [A-Za-z])
+                 |\{\\(?:%(specials)s)\}
+                 |\\(?:%(specials)s)(?:\{\}|(?![A-Za-z])\ ?)'''
+LATEX_TOKEN_CHARS = re.compile(r'[{}\s]')
+
+
+@lru_cache(maxsize=None)
+def html_tables():
+	"""Get dicts for escaping non-ASCII characters with HTML entities, and
+	for unescaping all HTML5 named entities. Entities for ASCII characters,
+	such as '&amp;' and '&lt;', are left alone in both directions.
+	"""
+	from html.entities import html5, codepoint2name
+	forward = dict(HTML_TABLE)
+	inverse = {value: key for key, value in HTML_TABLE}
+	for code, name in sorted(codepoint2name.items()):
+		forward.setdefault(chr(code), '&%s;' % name)
+	for name, char in sorted(html5.items(), key=lambda item: (len(item[0]), item[0])):
+		if name.endswith(';') and not char.isascii():
+			inverse.setdefault('&' + name, char)
+			if len(char) == 1:
+				forward.setdefault(char, '&' + name)
+	return forward, inverse
+
+def unescape_numeric(token):
+	"""Get the character for a numeric HTML reference, or the reference
+	itself if it is invalid or for an ASCII character.
+	"""
+	match = HTML_NUMERIC.match(token)
+	if match:
+		code = int(match.group(1), 16 if token[2] in 'xX' else 10)
+		if 0x7f < code <= 0x10ffff and not 0xd800 <= code <= 0xdfff:
+			return chr(code)
+	return token
+
+@lru_cache(maxsize=None)
+def latex_tables():
+	"""Get dicts for escaping non-ASCII characters with LaTeX accents and
+	macros, and for unescaping them. Keys for unescaping are the forms used
+	for escaping, and the forms without braces and spaces, e.g. '\\"a' for
+	\\"{a}, \\"a and \\" a, or '\\cc' for \\c{c} and \\c c.
+	"""
+	import unicodedata
+	forward = dict(LATEX_TABLE)
+	inverse = {}
+	for char, macro in LATEX_SPECIALS.items():
+		forward.setdefault(char, '\\%s{}' % macro)
+		inverse['\\' + macro] = inverse['\\%s{}' % macro] = char
+	for char, text in LATEX_TEXT.items():
+		forward.setdefault(char, text)
+	for accent, mark in LATEX_ACCENTS.items():
+		for base in 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz':
+			char = unicodedata.normalize('NFC', base + mark)
+			if len(char) == 1:
+				forward.setdefault(char, '\\%s{%s}' % (accent, base))
+				inverse['\\%s%s' % (accent, base)] = inverse['\\%s{%s}' % (accent, base)] = char
+				if base in 'ij':
+					inverse['\\%s\\%s' % (accent, base)] = char
+	return forward, inverse
+
+def make_engine(mode, inverse=False):
+	"""Create TokenSubstitution for all HTML entities or LaTeX accents.
+	@param mode: 'html' or 'latex'
+	@param inverse: if True, the escape sequences are subst. with the characters
+	"""
+	if mode == 'html':
+		forward, backward = html_tables()
+		if inverse:
+			return TokenSubstitution(HTML_REFERENCE, backward, 34, default=unescape_numeric)
+		return TokenSubstitution(HTML_CHAR, forward, 3, default=lambda c: '&#%d;' % ord(c))
+	if mode == 'latex':
+		forward, backward = latex_tables()
+		if inverse:
+			specials = '|'.join(sorted(LATEX_SPECIALS.values(), key=len, reverse=True))
+			return TokenSubstitution(LATEX_TOKEN % {'specials': specials}, backward, 12,
+			                         normalize=lambda token: LATEX_TOKEN_CHARS.sub('', token),
+			                         flags=re.X)
+		return TokenSubstitution(r'[^\x00-\x7f]', forward, 1)
+	raise ValueError('unknown mode: ' + mode)
+
+@lru_cache(maxsize=None)
+def get_engine(mode, inverse=False):
+	"""Get (cached) TokenSubstitution for the mode, created on first use."""
+	return make_engine(mode, inverse)
+
+
+class LexerState:
+	"""State of the lexer finding protected regions, e.g. "in HTML comment".
+
+	The pattern matches the tokens relevant in this state, each in a named
+	group, e.g. the end of the comment. The transitions map group names to
+	the next state, or to a function getting the next state for the match;
+	for other tokens, the state does not change.
+	"""
+
+	def __init__(self, pattern, transitions=None, flags=0):
+		self.pattern = re.compile(pattern, flags)
+		self.transitions = transitions or {}
+
+	def next(self, match):
+		"""Get state following the matched token."""
+		target = self.transitions.get(match.lastgroup, self)
+		return target(match) if callable(target) else target
+
+
+class ContextSubstitution:
+	"""Substitution applied only outside of protected regions.
+
+	A lexer, starting in the text state, follows the document from token to
+	token, e.g. from the start to the end of a <script> element, and only
+	the text between tokens in the text state is passed to the substitution.
+	The tokens themselves are never substituted. The state is kept between
+	calls of sub_partial, so documents can be processed in chunks, and each
+	character is scanned only once, apart from the ends held back.
+	"""
+
+	def __init__(self, substitution, text_state, maxlen):
+		"""Create context-aware substitution.
+		@param substitution: the substitution to apply outside protected regions
+		@param text_state: initial LexerState, in which text is substituted
+		@param maxlen: maximum length of lexer tokens (including lookahead)
+		"""
+		self.substitution = substitution
+		self.text_state = self.state = text_state
+		self.maxlen = maxlen
+
+	def sub(self, string):
+		"""Get string with all keys substituted outside protected regions."""
+		return self.subn(string)[0]
+
+	def subn(self, string):
+		"""Get tuple of substituted string and number of substitutions."""
+		self.state = self.text_state
+		result, _, count = self.sub_partial(string, final=True)
+		return result, count
+
+	def sub_partial(self, buf, final=False):
+		"""Substitute keys outside protected regions in a buffer that may be
+		followed by more text; see Substitution.sub_partial.
+		"""
+		out, pos, count, rest = [], 0, 0, ''
+		hold = len(buf) if final else len(buf) - self.maxlen + 1
+		while True:
+			match = self.state.pattern.search(buf, pos)
+			if match is None or match.start() >= hold:
+				# end of buffer, and possibly beginning of incomplete token
+				stop = len(buf) if final else max(hold, pos)
+				if self.state is not self.text_state:
+					out.append(buf[pos:stop])
+				else:
+					text, rest, num = self.substitution.sub_partial(buf[pos:stop], final)
+					out.append(text)
+					count += num
+				rest += buf[stop:]
+				break
+			if self.state is self.text_state:
+				text, num = self.substitution.subn(buf[pos:match.start()])
+				out.append(text)
+				count += num
+			else:
+				out.append(buf[pos:match.start()])
+			out.append(match.group())
+			pos = match.end()
+			self.state = self.state.next(match)
+		if final:
+			self.state = self.text_state
+		return ''.join(out), rest, count
+
+	def find_change(self, buf, final=False):
+		"""Check whether substituting the buffer would change anything; see
+		Substitution.find_change. The buffer is substituted to find out.
+		"""
+		_, rest, count = self.sub_partial(buf, final)
+		if count or final:
+			self.state = self.text_state
+		return bool(count), rest
+
+
+# HTML elements whose content is protected, in addition to tags and comments
+HTML_PROTECTED = ('script', 'style', 'pre', 'code', 'textarea')
+
+# LaTeX environments whose content is protected, in addition to inline and
+# display math, \verb and comments
+LATEX_PROTECTED = ('verbatim', 'Verbatim', 'lstlisting', 'minted', 'comment',
+                   'alltt', 'math', 'displaymath', 'equation', 'eqnarray',
+                   'align', 'alignat', 'flalign', 'gather', 'multline')
+
+def html_lexer():
+	"""Get initial state of lexer for HTML, protecting tags (including their
+	attributes), comments, and the content of HTML_PROTECTED elements.
+	"""
+	text = LexerState(r'(?P<comment><!--)|<(?P<element>%s)(?=[\s/>])|(?P<tag></?[A-Za-z!?])'
+	                  % '|'.join(HTML_PROTECTED), flags=re.I)
+
+	def tag_state(after):
+		tag = LexerState(r'(?P<dq>")|(?P<sq>\')|(?P<end>>)')
+		tag.transitions = {'dq': LexerState(r'(?P<end>")', {'end': tag}),
+		                   'sq': LexerState(r"(?P<end>')", {'end': tag}),
+		                   'end': after}
+		return tag
+
+	content = {name: tag_state(LexerState(r'(?P<end></%s)(?=[\s>])' % name,
+	                                      {'end': tag_state(text)}, re.I))
+	           for name in HTML_PROTECTED}
+	text.transitions = {'comment': LexerState(r'(?P<end>-->)', {'end': text}),
+	                    'element': lambda match: content[match.group('element').lower()],
+	                    'tag': tag_state(text)}
+	return text
+
+def latex_lexer():
+	"""Get initial state of lexer for LaTeX, protecting math ($...$, $$...$$,
+	\\(...\\), \\[...\\]), \\verb, comments, and LATEX_PROTECTED environments.
+	"""
+	text = LexerState(r'''(?P<escape>\\[\\$%%])|(?P<comment>%%)
+	                     |(?P<display>\$\$)|(?P<inline>\$)|(?P<paren>\\\()|(?P<bracket>\\\[)
+	                     |\\begin\{(?P<env>(?:%s)\*?)\}
+	                     |\\verb\*?(?P<delim>[^A-Za-z\s*])''' % '|'.join(LATEX_PROTECTED), flags=re.X)
+	closing = lambda pattern: LexerState(pattern, {'end': text})
+	environments, verbs = {}, {}
+
+	def environment(match):
+		name = match.group('env')
+		if name not in environments:
+			environments[name] = closing(r'(?P<end>\\end\{%s\})' % re.escape(name))
+		return environments[name]
+
+	def verb(match):
+		delim = match.group('delim')
+		if delim not in verbs:
+			verbs[delim] = closing(r'(?P<end>%s)' % re.escape(delim))
+		return verbs[delim]
+
+	text.transitions = {'comment': closing(r'(?P<end>\n)'),
+	                    'display': closing(r'(?P<escape>\\.)|(?P<end>\$\$)'),
+	                    'inline': closing(r'(?P<escape>\\.)|(?P<end>\$)'),
+	                    'paren': closing(r'(?P<end>\\\))|(?P<escape>\\.)'),
+	                    'bracket': closing(r'(?P<end>\\\])|(?P<escape>\\.)'),
+	                    'env': environment, 'delim': verb}
+	return text
+
+# lexers for protected regions, and maximum length of their tokens
+LEXERS = {'html': (html_lexer, 12), 'latex': (latex_lexer, 32)}
+
+def make_context_engine(mode, inverse=False):
+	"""Create ContextSubstitution with the full tables for the mode. Unlike
+	the engines themselves, these are stateful, so use one per document.
+	"""
+	lexer, maxlen = LEXERS[mode]
+	return ContextSubstitution(get_engine(mode, inverse), lexer(), maxlen)
+
+
+def process_file(fname, substitution, backup=True, chunk_size=CHUNK_SIZE):
+	"""Apply substitution to file, reading and writing it in chunks.
+	@param fname: name of the file to process
+	@param substitution: a Substitution, or anything with a sub_partial method
+	@param backup: if True, the original file is kept as fname + '.bak'
+	@param chunk_size: number of characters read at once
+	@return: number of substitutions made
+	The result is written to a temporary file in the same directory, which
+	then replaces the original file. The backup is made by hard-linking (or,
+	if that is not possible, renaming) the original, not by copying it. If
+	nothing was substituted, the file is left untouched and no backup made.
+	"""
+	fd, tmp_name = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(fname)),
+	                                prefix=".umlautescape-", suffix=".tmp")
+	count = 0
+	try:
+		with open(fname, 'r', newline='') as in_file, os.fdopen(fd, 'w', newline='') as out_file:
+			rest = ''
+			while True:
+				chunk = in_file.read(chunk_size)
+				out, rest, num = substitution.sub_partial(rest + chunk, final=not chunk)
+				out_file.write(out)
+				count += num
+				if not chunk:
+					break
+		if not count:
+			os.remove(tmp_name)
+			return count
+		os.chmod(tmp_name, os.stat(fname).st_mode)
+		if backup:
+			bak_name = fname + '.bak'
+			if os.path.lexists(bak_name):
+				os.remove(bak_name)
+			try:
+				os.link(fname, bak_name)
+			except OSError:
+				os.rename(fname, bak_name)
+		os.replace(tmp_name, fname)
+	except BaseException:
+		os.remove(tmp_name)
+		raise
+	return count
+
+def needs_change(fname, substitution, chunk_size=CHUNK_SIZE):
+	"""Check whether the substitution would change the file, reading it in
+	chunks only until the first change is found.
+	"""
+	with open(fname, 'r', newline='') as in_file:
+		rest = ''
+		while True:
+			chunk = in_file.read(chunk_size)
+			found, rest = substitution.find_change(rest + chunk, final=not chunk)
+			if found or not chunk:
+				return found
+
+def file_hash(fname):
+	"""Get SHA-1 hex digest of the file's content."""
+	digest = hashlib.sha1()
+	with open(fname, 'rb') as f:
+		for block in iter(lambda: f.read(CHUNK_SIZE), b''):
+			digest.update(block)
+	return digest.hexdigest()
+
+def load_cache(cache_name):
+	"""Load cache of files known not to need changes, or get empty cache."""
+	try:
+		with open(cache_name) as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		return {}
+
+def save_cache(cache_name, cache):
+	"""Save the cache, replacing the old cache file atomically."""
+	with open(cache_name + '.tmp', 'w') as f:
+		json.dump(cache, f, indent=0, sort_keys=True)
+	os.replace(cache_name + '.tmp', cache_name)
+
+
+def process_task(task):
+	"""Process a single file in a worker process.
+	@param task: tuple (file name, mode, inverse, context, check, caching,
+	cache entry) where check means to only check whether the file needs
+	changes, caching whether a cache is used at all, and the cache entry is
+	a dict with size, mtime and hash of the file when it last did not need
+	any changes, or None if the file is not known
+	@return: tuple (file name, bytes scanned, substitutions, status, new
+	cache entry or None, always None without caching); status is one of
+	'cached', 'unchanged', 'changed', 'needs changes' (check only), or an
+	error message
+	"""
+	fname, mode, inverse, context, check, caching, entry = task
+	try:
+		stat = os.stat(fname)
+		if entry is not None:
+			if entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+				return fname, 0, 0, 'cached', entry
+			if entry['size'] == stat.st_size and entry['hash'] == file_hash(fname):
+				return fname, stat.st_size, 0, 'cached', dict(entry, mtime=stat.st_mtime_ns)
+		engine = make_context_engine(mode, inverse) if context else get_engine(mode, inverse)
+		if check:
+			count = int(needs_change(fname, engine))
+			status = 'needs changes' if count else 'unchanged'
+		else:
+			count = process_file(fname, engine)
+			status = 'changed' if count else 'unchanged'
+		if not caching or (count and check):
+			return fname, stat.st_size, count, status, None
+		new_stat = os.stat(fname)
+		entry = {'size': new_stat.st_size, 'mtime': new_stat.st_mtime_ns, 'hash': file_hash(fname)}
+		return fname, stat.st_size, count, status, entry
+	except (OSError, UnicodeError) as e:
+		return fname, 0, 0, 'ERROR: %s' % e, None
+
+
+def expand_paths(paths, include=None, exclude=None):
+	"""Get sorted list of files for the given files, directories (searched
+	recursively) and glob patterns.
+	@param include: list of patterns; if given, file names must match one
+	@param exclude: list of patterns for file and directory names to skip
+	@raise FileNotFoundError: listing all glob patterns not matching any file
+	"""
+	matches = lambda name, patterns: any(fnmatch.fnmatch(name, p) for p in patterns or ())
+	files, unmatched = set(), []
+	for path in paths:
+		names = glob.glob(path, recursive=True) if glob.has_magic(path) else [path]
+		if not names:
+			unmatched.append(path)
+		for name in names:
+			if os.path.isdir(name):
+				for dirpath, dirnames, filenames in os.walk(name):
+					dirnames[:] = [d for d in dirnames if not matches(d, exclude)]
+					files.update(os.path.join(dirpath, f) for f in filenames)
+			else:
+				files.add(name)
+	if unmatched:
+		raise FileNotFoundError("No files matching: %s" % ", ".join(unmatched))
+	return sorted(f for f in files if (include is None or matches(os.path.basename(f), include))
+	              and not matches(os.path.basename(f), exclude))
+
 
 def main():
 	"""Parse command line options and run application.
 	"""
-	import optparse, shutil
+	import optparse
+	from concurrent.futures import ProcessPoolExecutor
 
 	# parse and check command line options
-	parser = optparse.OptionParser("umlautescape.py [Options] File")
+	parser = optparse.OptionParser("umlautescape.py [Options] File|Directory|Glob...")
 	parser.add_option("-m", "--mode", dest="mode", 
 					  help="mode; one from " + str(TABLES.keys()))
 	parser.add_option("-i", "--inverse", dest="inverse", action="store_true",
 					  help="reverse substitution?", default=False)
+	parser.add_option("-c", "--context", dest="context", action="store_true", default=False,
+					  help="skip markup, code and math regions")
+	parser.add_option("--include", dest="include", action="append",
+					  help="process only files matching this pattern, e.g. '*.tex'")
+	parser.add_option("--exclude", dest="exclude", action="append", default=["*.bak"],
+					  help="skip files and directories matching this pattern")
+	parser.add_option("-j", "--jobs", dest="jobs", type="int", default=None,
+					  help="number of worker processes; default: number of CPUs")
+	parser.add_option("--check", "--dry-run", dest="check", action="store_true", default=False,
+					  help="only check whether files need changes; exit with 1 if so")
+	parser.add_option("--cache", dest="cache", default=None,
+					  help="JSON file for skipping files known not to need changes")
 	(options, args) = parser.parse_args()
-	if len(args) != 1:
+	if not args:
 		parser.error("no file given")
 	if not options.mode:
 		parser.error("no mode given")
 	elif not options.mode in TABLES.keys():
 		parser.error("unknown mode: " + options.mode)
 	
-	# read filename from command line and read file content
-	fname = args[0]
-	with  open(fname, 'r') as in_file:
-		content = in_file.read()
-
-	# create backup copy
-	shutil.copyfile(fname, fname + '.bak')
-
-	# replace umlauts in content
-	content = replace(content, TABLES[options.mode], options.inverse)
+	# cache entries are only valid for the same mode and options
+	key = '%s%s%s' % (options.mode, ' inverse' if options.inverse else '',
+	                  ' context' if options.context else '')
+	cache = load_cache(options.cache).get(key, {}) if options.cache else None
+	entry = lambda fname: cache.get(os.path.abspath(fname)) if cache is not None else None
 
-	# write file
-	with open(fname, 'w') as out_file:
-		out_file.write(content)
+	# replace umlauts in all files (or just check them), keeping backups of changed files
+	try:
+		files = expand_paths(args, options.include, options.exclude)
+	except FileNotFoundError as e:
+		parser.error(str(e))
+	if options.cache:
+		files = [f for f in files if os.path.abspath(f) != os.path.abspath(options.cache)]
+	tasks = [(fname, options.mode, options.inverse, options.context, options.check,
+	          cache is not None, entry(fname)) for fname in files]
+	total_size, total_count, failed = 0, 0, 0
+	with ProcessPoolExecutor(options.jobs) as executor:
+		for fname, size, count, status, new_entry in executor.map(process_task, tasks, chunksize=16):
+			if cache is not None:
+				if new_entry is None:
+					cache.pop(os.path.abspath(fname), None)
+				else:
+					cache[os.path.abspath(fname)] = new_entry
+			if status.startswith('ERROR'):
+				failed += 1
+				print("%12s %8s  %s: %s" % ("-", "ERROR", fname, status[7:]))
+				continue
+			total_size += size
+			total_count += count
+			print("%12d %8d  %s%s" % (size, count, fname, "" if status == 'changed' else " (%s)" % status))
+	if options.cache:
+		save_cache(options.cache, dict(load_cache(options.cache), **{key: cache}))
+	if options.check:
+		print("%12d %8d  total bytes scanned and files needing changes of %d files"
+		      % (total_size, total_count, len(files)))
+	else:
+		print("%12d %8d  total bytes scanned and replacements in %d files"
+		      % (total_size, total_count, len(files)))
+	if failed or (options.check and total_count):
+		sys.exit(1)
 			
 # Run script from command line
 if __name__ == "__main__":
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+"""Benchmark for the substitutions of umlautescape.py.
+by Tobias Küster, 2010
+
+Compares the single-pass Substitution with the old loop calling str.replace
+once per table entry, on a generated document of the given size. For small
+tables, the loop is faster, as each str.replace is a fast scan in C, but its
+time grows with each entry of the table, while the single pass does not.
+
+Usage: umlautescape_bench.py [Options]
+"""
+
+import random
+import time
+from html.entities import codepoint2name
+from umlautescape import TABLES, Substitution, get_engine
+
+# some words with and without Umlauts, for generating documents
+WORDS = ("Küster", "Müller", "Straße", "Größe", "Äpfel", "Übung", "schön",
+         "the", "quick", "brown", "fox", "jumps", "over", "lazy", "dog",
+         "--", "---", "and", "with", "text", "document", "example")
+
+
+def replace_loop(string, tuples, inverse=False):
+	"""The old replace function, calling str.replace for each tuple."""
+	for key, value in tuples:
+		if inverse:
+			key, value = value, key
+		string = string.replace(key, value)
+	return string
+
+def generate_document(size, seed=0):
+	"""Get random text with about size characters."""
+	rnd = random.Random(seed)
+	words, length = [], 0
+	while length < size:
+		word = rnd.choice(WORDS)
+		words.append(word + ("\n" if rnd.random() < 0.1 else " "))
+		length += len(word) + 1
+	return "".join(words)
+
+def timed(func, *args):
+	"""Get result of calling the function and the elapsed time."""
+	start = time.time()
+	result = func(*args)
+	return result, time.time() - start
+
+
+def main():
+	"""Parse command line options and run the benchmark.
+	"""
+	import optparse
+
+	parser = optparse.OptionParser("umlautescape_bench.py [Options]")
+	parser.add_option("-s", "--size", dest="size", type="float", default=10,
+	                  help="size of generated document in MB")
+	(options, args) = parser.parse_args()
+
+	text = generate_document(int(options.size * 2**20))
+	# all Latin-1 entities, showing the cost of many passes for large tables
+	tables = dict(TABLES, entities=[(chr(c), "&%s;" % name) for c, name in codepoint2name.items()])
+	for mode, table in sorted(tables.items()):
+		escaped = None
+		for inverse in (False, True):
+			string = escaped if inverse else text
+			old, old_time = timed(replace_loop, string, table, inverse)
+			new, new_time = timed(Substitution(table, inverse).sub, string)
+			escaped = new
+			print("%-8s %-8s loop: %6.3f s   single pass: %6.3f s   %s"
+			      % (mode, "inverse" if inverse else "forward", old_time, new_time,
+			         "same result" if old == new else "DIFFERENT result"))
+
+	# full tables, with all HTML entities and LaTeX accents
+	for mode in sorted(TABLES):
+		escaped, _ = timed(get_engine(mode).sub, text)
+		for inverse in (False, True):
+			_, new_time = timed(get_engine(mode, inverse).sub, escaped if inverse else text)
+			print("%-8s %-8s full tables:        %6.3f s"
+			      % (mode, "inverse" if inverse else "forward", new_time))
+
+if __name__ == "__main__":
+	main()